@@ -12,25 +12,43 @@
 # 6) 불러오기 후 NaN/누락 컬럼 자동보정(IDs/UOM/Warehouse) + 안전 캐스팅으로 기타출고 오류 해결
 # ----------------------------------------
 
+import os
 import json
 import re
 import base64
+import sqlite3
+import codecs
+import hashlib
+import gzip
+import io
+import copy
+import itertools
+import threading
+import time
 import datetime as dt
-from typing import Any, Dict, Optional, List, Tuple, Set
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, Optional, List, Tuple, Set
 from zoneinfo import ZoneInfo  # ← KST 고정용 추가
 
 
 import requests
+import numpy as np
 import pandas as pd
+from array import array
 import streamlit as st
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, DataReturnMode, JsCode
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # =========================
 # 전역 설정 (다크모드 + 페이지 설정)
 # =========================
 
 st.set_page_config(page_title="MES 로그인 (1단계)", layout="wide")
+# 세션의 표(lot_df·cart_df·preview_df_full)는 읽기 전용 뷰로 공유하고, 수정하는 쪽에서만 복사
+pd.set_option("mode.copy_on_write", True)
 
 DARK_CSS = """
 <style>
@@ -122,33 +140,213 @@ def _split_or_terms(s: str) -> List[str]:
 def _wildcard_to_regex(term: str) -> str:
   return "".join([".*" if ch == "%" else re.escape(ch) for ch in term])
 
+# ---- 클라이언트 필터: 고유값 단위 str.contains(대소문자 무시) + 품목명 초성 ----
+_CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_CHOSUNG_COLS = ("itemName",)   # 초성 검색을 지원하는 컬럼
+
+def _to_chosung(s: str) -> str:
+  return "".join(_CHOSUNG[(ord(ch) - 0xAC00) // 588] if "가" <= ch <= "힣" else ch for ch in s)
+
+def _is_chosung_term(term: str) -> bool:
+  core = term.replace("%", "").replace(" ", "")
+  return bool(core) and all("ㄱ" <= ch <= "ㅎ" for ch in core)
+
+def _has_chosung_cond(conds: Dict[str, str]) -> bool:
+  """서버 LIKE로 거를 수 없는 초성 검색어가 조건에 있는지"""
+  return any(_is_chosung_term(t) for c in _CHOSUNG_COLS for t in _split_or_terms(conds.get(c) or ""))
+
+def _column_mask(s: pd.Series, col: str, terms: List[str]) -> np.ndarray:
+  """컬럼 1개의 OR 항목 일치 마스크. str.contains는 고유값(factorize)에만 돌리고 코드 배열로 행에 펼친다"""
+  codes, uniques = pd.factorize(s.astype(object).fillna("").astype(str))
+  uniq = pd.Series(uniques, dtype=object).astype(str)
+  cho = [t.replace(" ", "") for t in terms if col in _CHOSUNG_COLS and _is_chosung_term(t)]
+  plain = [t for t in terms if not (col in _CHOSUNG_COLS and _is_chosung_term(t))]
+  ok = np.zeros(len(uniq), dtype=bool)
+  if plain:
+    pattern = "(?:" + "|".join(_wildcard_to_regex(t) for t in plain) + ")"
+    ok |= uniq.str.contains(pattern, flags=re.IGNORECASE, regex=True).to_numpy(dtype=bool)
+  if cho:
+    pattern = "(?:" + "|".join(_wildcard_to_regex(t) for t in cho) + ")"
+    ok |= uniq.map(lambda u: _to_chosung(u).replace(" ", "")).str.contains(pattern, regex=True).to_numpy(dtype=bool)
+  return ok[codes]
+
+def _frame_memo(slot: str, df: pd.DataFrame, build: Callable[[pd.DataFrame], Any]) -> Any:
+  """DataFrame 객체별 파생값(인덱스 등)을 세션 캐시 slot에 보관. 같은 객체일 때만 재사용"""
+  cache = st.session_state.get(slot)
+  if cache is None:
+    cache = st.session_state[slot] = _TTLCache(600, max_size=4)
+  hit, val = cache.get(id(df))
+  if not hit or val[0] is not df:   # id 재사용 방지
+    val = (df, build(df))
+    cache.put(id(df), val)
+  return val[1]
+
 def _apply_client_filters(df: pd.DataFrame, conds: Dict[str, str]) -> pd.DataFrame:
-  filtered = df
-  for col, raw in conds.items():
-    if not raw or col not in filtered.columns:
-      continue
-    terms = _split_or_terms(raw)
-    if not terms:
-      continue
-    regexes = [_wildcard_to_regex(t) for t in terms]
-    pattern = "(" + "|".join(regexes) + ")"
-    filtered = filtered[filtered[col].fillna("").astype(str).str.contains(pattern, flags=re.IGNORECASE, regex=True)]
-  return filtered
+  active = {c: v for c, v in conds.items() if v and c in df.columns and _split_or_terms(v)}
+  if not active or df.empty:
+    return df
+  m = np.ones(len(df.index), dtype=bool)
+  for col, raw in active.items():
+    m &= _column_mask(df[col], col, _split_or_terms(raw))
+  return df[m]
+
+# ---- 세션 표 스냅샷: 읽기는 뷰, 쓰기는 새 버전 + 내용 해시 ----
+SNAPSHOT_KEYS = ("lot_df", "cart_df", "preview_df_full")
+
+def _frame_hash(df: pd.DataFrame) -> str:
+  h = hashlib.blake2b(digest_size=16)
+  h.update(json.dumps([[str(c) for c in df.columns], [str(t) for t in df.dtypes]]).encode("utf-8"))
+  try:
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+  except TypeError:   # dict 등 해시 불가 셀이 섞인 경우
+    h.update(df.to_json(orient="values", default_handler=str).encode("utf-8"))
+  return h.hexdigest()
+
+def _snap(name: str) -> pd.DataFrame:
+  """세션 표의 읽기 전용 뷰(copy-on-write: 호출 측에서 수정하면 그때 복사)"""
+  return st.session_state[name].copy(deep=False)
+
+def _snap_hash(name: str) -> str:
+  return _frame_memo("snap_hashes", st.session_state[name], _frame_hash)
+
+def _snap_put(name: str, df: pd.DataFrame) -> bool:
+  """새 버전 저장. 내용이 같으면 기존 객체를 유지해 객체별 인덱스·변환 결과를 그대로 재사용. 변경 여부 반환"""
+  cur = st.session_state.get(name)
+  if cur is df or (isinstance(cur, pd.DataFrame) and _snap_hash(name) == _frame_memo("snap_hashes", df, _frame_hash)):
+    return False
+  st.session_state[name] = df
+  vers = st.session_state.setdefault("snap_versions", {})
+  vers[name] = vers.get(name, 0) + 1
+  return True
+
+def _snap_records(name: str) -> List[Dict[str, Any]]:
+  """to_dict(records) 결과를 스냅샷별로 한 번만 생성"""
+  return _frame_memo("snap_records", st.session_state[name], lambda d: d.to_dict(orient="records"))
+
+# ---- 미리보기 스냅샷 파일: 열 단위 + 문자열 사전 인코딩 + gzip, 청크 단위로 스트리밍 복원 ----
+# 1행: 헤더(JSON: format·schema_version·columns[{name,type,nullable}]·meta), 이후 행마다 청크 1개({컬럼: 값 배열}).
+PREVIEW_COLUMNAR_FORMAT = "mes-preview-columnar"
+PREVIEW_COLUMNAR_VERSION = 1
+PREVIEW_CHUNK_ROWS = 5000
+
+def _column_kind(name: str, s: pd.Series) -> Tuple[str, bool]:
+  if name in LOT_SCHEMA:
+    return LOT_SCHEMA[name]
+  if pd.api.types.is_integer_dtype(s.dtype):
+    return "int", False
+  if pd.api.types.is_float_dtype(s.dtype):
+    return "float", True
+  if isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty"):
+    return "str", True
+  return "json", True   # 섞인 값은 원본 그대로
+
+def _preview_to_columnar(df: pd.DataFrame, meta: Dict[str, Any]) -> bytes:
+  cols = [{"name": str(c), "type": k, "nullable": n} for c in df.columns for k, n in [_column_kind(str(c), df[c])]]
+  buf = io.BytesIO()
+  with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gz:
+    head = {"format": PREVIEW_COLUMNAR_FORMAT, "schema_version": PREVIEW_COLUMNAR_VERSION,
+            "rows": len(df.index), "columns": cols, "meta": meta}
+    gz.write(json.dumps(head, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+    for start in range(0, len(df.index), PREVIEW_CHUNK_ROWS):
+      part = df.iloc[start:start + PREVIEW_CHUNK_ROWS]
+      chunk: Dict[str, Any] = {}
+      for c in cols:
+        v = part[c["name"]]
+        if c["type"] == "str":
+          codes, uniq = pd.factorize(v)   # 결측은 -1
+          chunk[c["name"]] = {"d": [str(u) for u in uniq], "c": codes.tolist()}
+        elif c["type"] == "int":
+          chunk[c["name"]] = pd.to_numeric(v, errors="coerce").fillna(0).astype(np.int64).tolist()
+        elif c["type"] == "float":
+          chunk[c["name"]] = pd.to_numeric(v, errors="coerce").astype(np.float64).tolist()
+        else:
+          chunk[c["name"]] = v.tolist()
+      gz.write(json.dumps(chunk, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+  return buf.getvalue()
+
+def _preview_from_columnar(fileobj: Any) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+  """청크를 한 줄씩 풀어 컬럼 버퍼에 누적(전체 JSON 트리를 만들지 않음). (df, meta) 반환"""
+  with gzip.GzipFile(fileobj=fileobj, mode="rb") as gz:
+    head = json.loads(gz.readline())
+    if head.get("format") != PREVIEW_COLUMNAR_FORMAT or int(head.get("schema_version") or 0) > PREVIEW_COLUMNAR_VERSION:
+      raise ValueError(f"지원하지 않는 스냅샷 형식: {head.get('format')} v{head.get('schema_version')}")
+    cols = head["columns"]
+    bufs: Dict[str, Any] = {
+      c["name"]: array("q") if c["type"] == "int" else array("d") if c["type"] == "float" else []
+      for c in cols
+    }
+    for line in gz:
+      if not line.strip():
+        continue
+      chunk = json.loads(line)
+      for c in cols:
+        v = chunk[c["name"]]
+        if c["type"] == "str":
+          lookup = np.asarray(v["d"] + [None], dtype=object)   # 코드 -1 → None
+          bufs[c["name"]].append(lookup[np.asarray(v["c"], dtype=np.intp)])
+        else:
+          bufs[c["name"]].extend(v)
+  data: Dict[str, Any] = {}
+  for c in cols:
+    b = bufs[c["name"]]
+    if c["type"] == "str":
+      data[c["name"]] = np.concatenate(b) if b else np.empty(0, dtype=object)
+    elif c["type"] in ("int", "float"):
+      data[c["name"]] = np.asarray(b)
+    else:
+      data[c["name"]] = pd.Series(b, dtype=object)
+  return pd.DataFrame(data, columns=[c["name"] for c in cols]), head.get("meta") or {}
+
+def _snap_columnar(name: str, meta: Dict[str, Any]) -> bytes:
+  """열 단위 스냅샷 바이트를 스냅샷·meta별로 한 번만 생성(saved_at은 생성 시각)"""
+  memo = _frame_memo("snap_exports", st.session_state[name], lambda d: {})
+  key = json.dumps(meta, sort_keys=True, default=str)
+  if key not in memo:
+    memo.clear()
+    memo[key] = _preview_to_columnar(st.session_state[name], dict(meta, saved_at=now_kst().isoformat()))
+  return memo[key]
+
+# ---- (lotCode, itemCode) 키 인덱스: 담기/삭제를 선택 행 수 비례로 ----
+LotKey = Tuple[str, str]
+
+def _build_lot_key_index(df: pd.DataFrame) -> Tuple[pd.MultiIndex, pd.MultiIndex, np.ndarray]:
+  if df.empty or not {"lotCode", "itemCode"} <= set(df.columns):
+    empty = pd.MultiIndex.from_arrays([[], []])
+    return empty, empty, np.empty(0, dtype=np.intp)
+  ki = pd.MultiIndex.from_arrays([df["lotCode"].astype(str).values, df["itemCode"].astype(str).values])
+  first = ~ki.duplicated()
+  return ki, ki[first], np.flatnonzero(first)
+
+def _lot_key_index(df: pd.DataFrame) -> Tuple[pd.MultiIndex, pd.MultiIndex, np.ndarray]:
+  """(전체 키, 고유 키, 고유 키의 첫 행 위치). 스냅샷별로 한 번만 생성"""
+  return _frame_memo("key_indexes", df, _build_lot_key_index)
+
+def _lot_lookup(df: pd.DataFrame, keys: List[LotKey]) -> np.ndarray:
+  """keys 각각의 첫 행 위치(없으면 -1)"""
+  _, uniq, pos = _lot_key_index(df)
+  if not keys or len(uniq) == 0:
+    return np.full(len(keys), -1, dtype=np.intp)
+  hit = uniq.get_indexer(pd.MultiIndex.from_tuples(keys))
+  return np.where(hit >= 0, pos[np.maximum(hit, 0)], -1)
+
+def _lot_positions(df: pd.DataFrame, keys: List[LotKey]) -> np.ndarray:
+  """keys에 해당하는 모든 행 위치(중복 키 포함)"""
+  ki, uniq, _ = _lot_key_index(df)
+  if not keys or len(uniq) == 0:
+    return np.empty(0, dtype=np.intp)
+  if len(uniq) < len(ki):   # 중복 키가 있는 프레임은 전체 비교
+    return np.flatnonzero(ki.isin(keys))
+  hit = _lot_lookup(df, keys)
+  return np.sort(hit[hit >= 0])
+
+def _sel_keys(sel: pd.DataFrame) -> List[LotKey]:
+  return list(dict.fromkeys(zip(sel["lotCode"].astype(str), sel["itemCode"].astype(str))))
 
 def _with_leading_percent(s: str) -> str:
   if not s:
     return ""
   return s if s.startswith("%") else "%" + s
 
-def _sel_len(sel) -> int:
-  if sel is None:
-    return 0
-  if isinstance(sel, list):
-    return len(sel)
-  if isinstance(sel, pd.DataFrame):
-    return len(sel.index)
-  return 0
-
 def _to_int_safe(v: Any, default: int = 0) -> int:
   try:
     if pd.isna(v):
@@ -170,10 +368,216 @@ def _http_post_json(sess: requests.Session, url: str, payload: Dict[str, Any], t
   except Exception:
     return {}
 
+# ---- 목록형 응답(data.list) 스트리밍 디코드 → 컬럼 버퍼 → DataFrame ----
+_JSON_DECODER = json.JSONDecoder()
+
+def _http_post_list_frame(sess: requests.Session, url: str, payload: Dict[str, Any], keep_cols: List[str],
+                          float_cols: Tuple[str, ...] = (), timeout: int = 60, chunk_size: int = 65536) -> pd.DataFrame:
+  """응답 전체를 dict 목록으로 만들지 않고 data.list 원소를 하나씩 읽어
+  keep_cols 컬럼만 컬럼별 버퍼(float_cols는 float64 배열)에 쌓아 DataFrame으로 반환.
+  최상위 → data → list 순으로 각 객체의 최상위 키만 따라가며(다른 키의 값은 통째로 건너뜀) 위치를 찾는다.
+  JSON 형식 오류나 data.list가 없으면 RequestException(빈 결과로 오인하지 않도록)"""
+  headers = {"Accept": "application/json", "Content-Type": "application/json"}
+  resp = sess.post(url, json=payload, headers=headers, timeout=timeout, stream=True)
+  try:
+    if resp.status_code != 200:
+      raise requests.RequestException(f"HTTP {resp.status_code}")
+    chunks = resp.iter_content(chunk_size=chunk_size)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, eof = "", 0, False
+
+    def _fill() -> bool:
+      nonlocal buf, pos, eof
+      if eof:
+        return False
+      try:
+        piece = utf8.decode(next(chunks))
+      except StopIteration:
+        piece = utf8.decode(b"", final=True)
+        eof = True
+      if pos > chunk_size:   # 이미 소비한 앞부분은 버려 버퍼 크기를 제한
+        buf, pos = buf[pos:], 0
+      buf += piece
+      return True
+
+    def _bad(what: str) -> requests.RequestException:
+      return requests.RequestException(f"응답 형식 오류: {what}")
+
+    def _ws() -> None:
+      nonlocal pos
+      while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+          pos += 1
+        if pos < len(buf) or not _fill():
+          return
+
+    def _value() -> Any:
+      nonlocal pos
+      _ws()
+      while True:
+        try:
+          val, end = _JSON_DECODER.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+          if _fill():
+            continue   # 값이 청크 경계에서 잘린 경우
+          raise _bad(str(e)) from e
+        if end >= len(buf) and _fill():
+          continue     # 숫자·리터럴은 잘려도 디코드되므로 뒤가 더 있으면 다시
+        pos = end
+        return val
+
+    def _enter_key(want: str) -> bool:
+      """현재 위치의 객체로 들어가 최상위 키 want의 값 앞까지 이동. 객체가 아니거나 키가 없으면 False"""
+      nonlocal pos
+      _ws()
+      if pos >= len(buf) or buf[pos] != "{":
+        return False
+      pos += 1
+      _ws()
+      if pos < len(buf) and buf[pos] == "}":
+        return False
+      while True:
+        key = _value()
+        _ws()
+        if not isinstance(key, str) or pos >= len(buf) or buf[pos] != ":":
+          raise _bad("객체 키")
+        pos += 1
+        if key == want:
+          return True
+        _value()
+        _ws()
+        if pos >= len(buf) or buf[pos] not in ",}":
+          raise _bad("객체 구분자")
+        pos += 1
+        if buf[pos - 1] == "}":
+          return False
+
+    if not (_enter_key("data") and _enter_key("list")):
+      raise _bad("data.list 없음")
+    _ws()
+    if pos >= len(buf) or buf[pos] != "[":
+      if _value() is None:   # "list": null은 빈 결과
+        return pd.DataFrame()
+      raise _bad("data.list가 배열이 아님")
+    pos += 1
+
+    floats = set(float_cols)
+    cols: Dict[str, Any] = {c: (array("d") if c in floats else []) for c in keep_cols}
+    seen: Set[str] = set()
+    while True:
+      while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+          pos += 1
+        if pos < len(buf) or not _fill():
+          break
+      if pos >= len(buf):
+        raise _bad("data.list가 닫히지 않음")
+      if buf[pos] == "]":
+        break
+      try:
+        obj, end = _JSON_DECODER.raw_decode(buf, pos)
+      except json.JSONDecodeError as e:
+        if _fill():
+          continue   # 원소가 청크 경계에서 잘린 경우
+        raise _bad(str(e)) from e
+      pos = end
+      if not isinstance(obj, dict):
+        continue
+      for c, col in cols.items():
+        v = obj.get(c)
+        if v is not None:
+          seen.add(c)
+        if c in floats:
+          try:
+            col.append(float(v) if v is not None and v != "" else float("nan"))
+          except (TypeError, ValueError):
+            col.append(float("nan"))
+        else:
+          col.append(v)
+    # 한 번도 값이 오지 않은 컬럼은 제외(pd.DataFrame(rows)와 동일한 컬럼 구성)
+    return pd.DataFrame({
+      c: (np.frombuffer(col, dtype="float64") if c in floats else col)
+      for c, col in cols.items() if c in seen
+    })
+  finally:
+    resp.close()
+
 # ---- 항상 KST(Asia/Seoul)로 timestamp 생성 ----
 def now_kst() -> dt.datetime:
   return dt.datetime.now(dt.timezone.utc).astimezone(ZoneInfo("Asia/Seoul"))
 
+# ---- 스레드 안전 TTL 캐시(선택적 LRU 상한) + hit/miss 카운터 ----
+class _TTLCache:
+  def __init__(self, ttl_sec: float, max_size: int = 0):
+    self.ttl_sec = float(ttl_sec)
+    self.max_size = int(max_size)   # 0이면 크기 제한 없음
+    self.hits = 0
+    self.misses = 0
+    self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: Any) -> Tuple[bool, Any]:
+    with self._lock:
+      ent = self._data.get(key)
+      if ent is None or time.monotonic() - ent[0] > self.ttl_sec:
+        if ent is not None:
+          del self._data[key]
+        self.misses += 1
+        return False, None
+      self._data.move_to_end(key)
+      self.hits += 1
+      return True, ent[1]
+
+  def has(self, key: Any) -> bool:
+    """카운터를 건드리지 않고 유효 항목 존재 여부만 확인"""
+    with self._lock:
+      ent = self._data.get(key)
+      return ent is not None and time.monotonic() - ent[0] <= self.ttl_sec
+
+  def put(self, key: Any, value: Any) -> None:
+    with self._lock:
+      self._put_locked(key, value)
+
+  def _put_locked(self, key: Any, value: Any) -> None:
+    self._data[key] = (time.monotonic(), value)
+    self._data.move_to_end(key)
+    while self.max_size and len(self._data) > self.max_size:
+      self._data.popitem(last=False)
+
+  def items(self) -> List[Tuple[Any, Any]]:
+    """유효한 (키, 값) 스냅샷"""
+    with self._lock:
+      now = time.monotonic()
+      return [(k, v) for k, (t, v) in self._data.items() if now - t <= self.ttl_sec]
+
+  def invalidate(self, pred: Optional[Callable[[Any], bool]] = None) -> int:
+    """pred(key)가 참인 항목(없으면 전체) 삭제, 삭제 건수 반환"""
+    with self._lock:
+      keys = [k for k in self._data if pred is None or pred(k)]
+      for k in keys:
+        del self._data[k]
+      return len(keys)
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      total = self.hits + self.misses
+      return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+              "hit_rate": (self.hits / total) if total else 0.0}
+
+PROFILE_CACHE_TTL_SEC = 600  # system-profile-control-value 캐시 유효시간
+ONHAND_CACHE_FRESH_SEC = 30      # 재고 조회 결과: 이 시간 안이면 그대로 사용
+ONHAND_CACHE_STALE_SEC = 300     # 이 시간까지는 오래된 결과를 즉시 보여주고 백그라운드 갱신
+ONHAND_CACHE_MAX = 50
+ITEM_CACHE_TTL_SEC = 1800    # 품목 마스터(plant-item-list) 캐시 유효시간
+ITEM_CACHE_MAX = 5000        # 품목 마스터 캐시 최대 항목 수(LRU)
+NAME_CODE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mes_cache", "item_name_codes.json")
+REPLICA_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mes_cache", "onhand_replica.sqlite")
+REPLICA_MAX_AGE_SEC = 15 * 60   # 로컬 복제본 조회 시 이보다 오래되면 백그라운드 재동기화
+REPLICA_PAGE_SIZE = 1000        # 복제본 동기화 페이지 크기
+REPLICA_MAX_ROWS = 200000       # 복제본 동기화 최대 행 수(안전장치)
+NAME_CODE_REVALIDATE_SEC = 6 * 3600  # (완) 품목명→코드 캐시: 이 시간이 지난 항목은 백그라운드 재검증
+SESSION_MEM_BUDGET_MB = int(os.environ.get("MES_SESSION_MEM_MB", "256"))  # 세션별 표 메모리 한도(기본값)
+
 # =========================
 # 상태 초기화
 # =========================
@@ -195,6 +599,9 @@ defaults = {
   "alias_selected": None,
   "preview_df_full": pd.DataFrame(),
   "label_copies": 1,
+  "http_workers": 8,   # 병렬 조회 동시 요청 수 상한
+  "profile_cache": _TTLCache(PROFILE_CACHE_TTL_SEC),
+  "mem_budget_mb": SESSION_MEM_BUDGET_MB,
 }
 for k, v in defaults.items():
   if k not in st.session_state:
@@ -271,6 +678,7 @@ if login_btn:
         else:
           st.session_state["sess"] = sess
           st.session_state["is_authed"] = True
+          st.session_state["profile_cache"].invalidate()
           st.session_state["base_url"] = base_url.strip()
           ck = sess.cookies
           st.session_state["auth_cookies"] = {
@@ -302,31 +710,156 @@ def _context_ids() -> Tuple[int, int, str, int]:
     user.get("userId") or 0,
   )
 
+# ---- 병렬 조회: 워커별 세션(로그인 쿠키 공유) + 순서 보존 + 실패 시 나머지 취소 ----
+_worker_local = threading.local()
+
+def _get_sess() -> requests.Session:
+  """워커 스레드 안이면 워커 전용 세션, 아니면 로그인 세션"""
+  s = getattr(_worker_local, "sess", None)
+  return s if s is not None else st.session_state["sess"]
+
+def _parallel_map(fn, items: List[Any], max_workers: Optional[int] = None,
+                  on_done: Optional[Callable[[int, Any], None]] = None) -> List[Any]:
+  """fn(item)을 제한된 워커 풀에서 실행하고 입력 순서대로 결과 반환.
+  on_done(i, result)은 작업이 끝나는 순서대로 메인 스레드에서 호출(진행 표시용).
+  하나라도 예외가 나면 대기 중인 작업은 취소하고 그 예외를 다시 던진다. 이미 실행 중이던 작업은
+  끝까지 기다리며, 그중 성공한 작업도 on_done으로 알린다(서버에 저장된 건을 놓치지 않도록).
+  풀 워커 안에서 다시 호출되면 새 풀을 열지 않고 순차 실행(동시 요청 수가 http_workers를 넘지 않도록)."""
+  items = list(items)
+  if not items:
+    return []
+  if getattr(_worker_local, "in_pool", False):
+    results = []
+    for i, it in enumerate(items):
+      results.append(fn(it))
+      if on_done is not None:
+        on_done(i, results[-1])
+    return results
+  limit = _to_int_safe(max_workers or st.session_state.get("http_workers"), 8)
+  workers = max(1, min(limit, len(items)))
+  base_sess = _get_sess()
+  cookies = base_sess.cookies.copy() if base_sess is not None else None
+  ctx = get_script_run_ctx()
+  opened: List[requests.Session] = []
+  lock = threading.Lock()
+
+  def _init_worker():
+    add_script_run_ctx(threading.current_thread(), ctx)
+    s = requests.Session()
+    if cookies is not None:
+      s.cookies.update(cookies)
+    _worker_local.sess = s
+    _worker_local.in_pool = True
+    with lock:
+      opened.append(s)
+
+  results: List[Any] = [None] * len(items)
+  ex = ThreadPoolExecutor(max_workers=workers, initializer=_init_worker)
+  futs: Dict[Any, int] = {}
+  reported: Set[int] = set()
+  try:
+    futs = {ex.submit(fn, it): i for i, it in enumerate(items)}
+    for f in as_completed(futs):
+      results[futs[f]] = f.result()
+      reported.add(futs[f])
+      if on_done is not None:
+        on_done(futs[f], results[futs[f]])
+  except BaseException:
+    ex.shutdown(wait=True, cancel_futures=True)
+    if on_done is not None:
+      # 실패 시점에 이미 실행 중이던 작업 중 끝까지 성공한 것
+      for f, i in sorted(futs.items(), key=lambda kv: kv[1]):
+        if i not in reported and not f.cancelled() and f.exception() is None:
+          on_done(i, f.result())
+    raise
+  finally:
+    ex.shutdown(wait=True)
+    for s in opened:
+      s.close()
+  return results
+
+def _run_in_background(fn: Callable[[], None], name: str = "mes-bg") -> None:
+  """화면 실행과 별개로 fn 실행(워커 전용 세션 + 스크립트 컨텍스트 부여). 예외는 삼킴"""
+  base_sess = _get_sess()
+  cookies = base_sess.cookies.copy() if base_sess is not None else None
+  ctx = get_script_run_ctx()
+
+  def _run():
+    s = requests.Session()
+    if cookies is not None:
+      s.cookies.update(cookies)
+    _worker_local.sess = s
+    try:
+      fn()
+    except Exception:
+      pass
+    finally:
+      _worker_local.sess = None
+      s.close()
+
+  t = threading.Thread(target=_run, name=name, daemon=True)
+  add_script_run_ctx(t, ctx)
+  t.start()
+
+def _get_system_profile_control_value(control_code: str) -> Optional[Dict[str, Any]]:
+  """system-profile-control-value 조회 (회사·공장·권한·컨트롤코드 단위 TTL 캐시)"""
+  company_id, plant_id, company_code, user_id = _context_ids()
+  authority_id = st.session_state["user_info"].get("authorityId") or 10033
+  cache = st.session_state["profile_cache"]
+  key = (company_id, plant_id, authority_id, control_code)
+  hit, val = cache.get(key)
+  if hit:
+    return val
+  sess: requests.Session = _get_sess()
+  base_url = st.session_state["base_url"].rstrip("/")
+  url = base_url + "/system/combo/system-profile-control-value"
+  payload = {
+    "companyId": company_id,
+    "plantId": plant_id,
+    "authorityId": authority_id,
+    "userId": user_id,
+    "controlCode": control_code,
+    "companyCode": company_code,
+    "languageCode": "KO",
+  }
+  data = _http_post_json(sess, url, payload, timeout=60)
+  lst = (((data or {}).get("data") or {}).get("list")) or []
+  if not lst:
+    return None
+  cache.put(key, lst[0])   # 빈 결과/실패는 캐시하지 않음
+  return lst[0]
+
+# 캐시 현황 패널에 표시할 캐시 목록 (표시명 → 캐시 반환 함수)
+CACHE_PANEL: Dict[str, Callable[[], Any]] = {
+  "시스템 프로파일": lambda: st.session_state.get("profile_cache"),
+  "LOT 키 인덱스": lambda: st.session_state.get("key_indexes"),
+}
+
+def _render_cache_stats() -> None:
+  for label, getter in CACHE_PANEL.items():
+    cache = getter()
+    if cache is None:
+      continue
+    s = cache.stats()
+    st.caption(f"{label}: {s['size']}건 · hit {s['hits']} / miss {s['misses']} ({s['hit_rate']:.0%})")
+  if st.button("캐시 비우기", key="btn_cache_clear"):
+    for getter in CACHE_PANEL.values():
+      cache = getter()
+      if cache is not None:
+        cache.invalidate()
+    st.toast("캐시를 비웠습니다.", icon="🧹")
+
 def _get_code_rule_id_for_another_acct() -> Optional[int]:
   try:
-    sess: requests.Session = st.session_state["sess"]
-    base_url = st.session_state["base_url"].rstrip("/")
-    company_id, plant_id, company_code, user_id = _context_ids()
-    url = base_url + "/system/combo/system-profile-control-value"
-    payload = {
-      "companyId": company_id,
-      "plantId": plant_id,
-      "authorityId": st.session_state["user_info"].get("authorityId") or 10033,
-      "userId": user_id,
-      "controlCode": "ANOTHER_ACCT_RULE",
-      "companyCode": company_code,
-      "languageCode": "KO",
-    }
-    data = _http_post_json(sess, url, payload, timeout=60)
-    lst = (((data or {}).get("data") or {}).get("list")) or []
-    if not lst:
+    rec = _get_system_profile_control_value("ANOTHER_ACCT_RULE")
+    if not rec:
       return None
-    return int(lst[0].get("controlTableKeyId") or 0)
+    return int(rec.get("controlTableKeyId") or 0)
   except Exception:
     return None
 
 def _get_account_num_by_code_rule(base_date_str: str) -> Optional[str]:
-  sess: requests.Session = st.session_state["sess"]
+  sess: requests.Session = _get_sess()
   base_url = st.session_state["base_url"].rstrip("/")
   company_id, plant_id, company_code, user_id = _context_ids()
   code_rule_id = _get_code_rule_id_for_another_acct()
@@ -353,9 +886,33 @@ def _get_account_num_by_code_rule(base_date_str: str) -> Optional[str]:
     return None
   return str(lst[0].get("codeRuleAssign") or "")
 
+# ---- 계정번호 채번: 채번 → 헤더 저장(top-save)만 배치 안에서 한 번에 하나씩 ----
+# code-rule-assign-data가 채번 시점에 번호를 예약(소비)하는지는 확인되지 않았다. 예약하지 않는 서버라면
+# 미리 여러 번 받아 두면 같은 번호가 반복되므로, 이전 직렬 흐름처럼 번호를 받은 그룹이 top-save로 그 번호를
+# 쓴 뒤에 다음 채번을 한다(어느 쪽 동작이든 안전). 나머지 단계(top-list·LOT 저장·전송)는 그룹끼리 병렬.
+class _AccountNumIssuer:
+  def __init__(self):
+    self._serial = threading.Lock()
+    self._issued: Set[Tuple[str, str]] = set()   # 이 배치에서 이미 쓴 (기준일, 번호)
+
+  def _take(self, base_date: str, retries: int = 5) -> Optional[str]:
+    for attempt in range(retries):
+      num = _get_account_num_by_code_rule(base_date)
+      if num and (base_date, num) not in self._issued:
+        self._issued.add((base_date, num))
+        return num
+      time.sleep(0.3 * (attempt + 1))   # 직전 저장이 아직 반영 전이면 같은 번호가 올 수 있어 잠시 후 재시도
+    return None
+
+  @contextmanager
+  def hold(self, base_date: str) -> Iterator[Optional[str]]:
+    """번호를 채번해 내주고, with 블록(그 번호의 top-save)이 끝날 때까지 다른 그룹의 채번을 막는다"""
+    with self._serial:
+      yield self._take(base_date)
+
 # ----- 기타출고 -----
 def _top_save_account_issue(header_rows: List[Dict[str, Any]]) -> Optional[int]:
-  sess: requests.Session = st.session_state["sess"]
+  sess: requests.Session = _get_sess()
   base_url = st.session_state["base_url"].rstrip("/")
   url = base_url + "/inv/stock-etc-issue/top-save"
   payload = {
@@ -373,12 +930,9 @@ def _top_save_account_issue(header_rows: List[Dict[str, Any]]) -> Optional[int]:
   except Exception:
     return None
 
-def _fetch_lot_onhand_record(item_id: int, lot_code: str, warehouse_id: int) -> Optional[Dict[str, Any]]:
-  sess: requests.Session = st.session_state["sess"]
-  base_url = st.session_state["base_url"].rstrip("/")
+def _lot_onhand_payload(item_id: int, lot_code: str, warehouse_id: int, page: int = 1, limit: int = 200) -> Dict[str, Any]:
   company_id, plant_id, company_code, _ = _context_ids()
-  url = base_url + "/inv/combo/warehouse-onhand-stock-lot-list"
-  payload = {
+  return {
     "languageCode": "KO",
     "companyId": company_id,
     "plantId": plant_id,
@@ -389,18 +943,56 @@ def _fetch_lot_onhand_record(item_id: int, lot_code: str, warehouse_id: int) ->
     "projectId": 0,
     "effectiveStartDate": None,
     "effectiveEndDate": None,
-    "page": 1,
-    "limit": 200,
+    "page": page,
+    "limit": limit,
     "companyCode": company_code,
   }
-  data = _http_post_json(sess, url, payload, timeout=60)
+
+def _fetch_lot_onhand_record(item_id: int, lot_code: str, warehouse_id: int) -> Optional[Dict[str, Any]]:
+  sess: requests.Session = _get_sess()
+  base_url = st.session_state["base_url"].rstrip("/")
+  url = base_url + "/inv/combo/warehouse-onhand-stock-lot-list"
+  data = _http_post_json(sess, url, _lot_onhand_payload(item_id, lot_code, warehouse_id), timeout=60)
   lst = (((data or {}).get("data") or {}).get("list")) or []
   if not lst:
     return None
   return lst[0]
 
+def _fetch_lot_onhand_index(item_id: int, warehouse_id: int, page_size: int = 200, max_pages: int = 50) -> Dict[str, Dict[str, Any]]:
+  """(품목, 창고)의 LOT 재고를 페이지 단위로 한 번에 받아 lotCode → record 인덱스 생성"""
+  sess: requests.Session = _get_sess()
+  base_url = st.session_state["base_url"].rstrip("/")
+  url = base_url + "/inv/combo/warehouse-onhand-stock-lot-list"
+  index: Dict[str, Dict[str, Any]] = {}
+  for page in range(1, max_pages + 1):
+    data = _http_post_json(sess, url, _lot_onhand_payload(item_id, "", warehouse_id, page, page_size), timeout=60)
+    lst = (((data or {}).get("data") or {}).get("list")) or []
+    before = len(index)
+    for rec in lst:
+      code = str((rec or {}).get("lotCode") or "")
+      if code and code not in index:
+        index[code] = rec
+    # 마지막 페이지이거나, 서버가 page를 무시하고 같은 목록을 돌려주면 중단
+    if len(lst) < page_size or len(index) == before:
+      break
+  return index
+
+def _resolve_lot_onhand_records(item_id: int, warehouse_id: int, lot_codes: List[str]) -> List[Optional[Dict[str, Any]]]:
+  """그룹 LOT들을 목록 1회 조회 인덱스로 해결하고, 없는 LOT만 단건 조회로 보충(입력 순서 유지)"""
+  try:
+    index = _fetch_lot_onhand_index(item_id, warehouse_id)
+  except requests.RequestException:
+    index = {}
+  misses = sorted({c for c in lot_codes if c not in index})
+  if misses:
+    found = _parallel_map(lambda c: _fetch_lot_onhand_record(item_id, c, warehouse_id), misses)
+    for c, rec in zip(misses, found):
+      if rec:
+        index[c] = rec
+  return [index.get(c) for c in lot_codes]
+
 def _lot_save_issue(lot_records: List[Dict[str, Any]]) -> bool:
-  sess: requests.Session = st.session_state["sess"]
+  sess: requests.Session = _get_sess()
   base_url = st.session_state["base_url"].rstrip("/")
   url = base_url + "/inv/stock_etc_issue/lot-save"
   payload = {
@@ -416,7 +1008,7 @@ def _lot_save_issue(lot_records: List[Dict[str, Any]]) -> bool:
   return bool((data or {}).get("success"))
 
 def _top_list_confirm_issue(account_num: str, item_code: str, ymd: str) -> Dict[str, Any]:
-  sess: requests.Session = st.session_state["sess"]
+  sess: requests.Session = _get_sess()
   base_url = st.session_state["base_url"].rstrip("/")
   company_id, plant_id, *_ = _context_ids()
   url = base_url + "/inv/stock-etc-issue/top-list"
@@ -447,7 +1039,7 @@ def _top_list_confirm_issue(account_num: str, item_code: str, ymd: str) -> Dict[
 def _transfer_account_issue(account_result_ids: List[int]) -> bool:
   if not account_result_ids:
     return False
-  sess: requests.Session = st.session_state["sess"]
+  sess: requests.Session = _get_sess()
   base_url = st.session_state["base_url"].rstrip("/")
   url = base_url + "/inv/stock-etc-issue/transfer"
   company_id, plant_id, company_code, _ = _context_ids()
@@ -464,7 +1056,7 @@ def _transfer_account_issue(account_result_ids: List[int]) -> bool:
 def _issue_top_update_transaction_date(row: Dict[str, Any], new_dt: str) -> bool:
   """기타출고 top-list로 받은 row를 현재시간 new_dt로 갱신(수정 저장)"""
   try:
-    sess: requests.Session = st.session_state["sess"]
+    sess: requests.Session = _get_sess()
     base_url = st.session_state["base_url"].rstrip("/")
     url = base_url + "/inv/stock-etc-issue/top-save"
     upd = dict(row)
@@ -488,7 +1080,7 @@ def _issue_top_update_transaction_date(row: Dict[str, Any], new_dt: str) -> bool
 def _receipt_top_update_transaction_date(row: Dict[str, Any], new_dt: str) -> bool:
   """기타입고 top-list로 받은 row를 현재시간으로 갱신(전체 행 U 저장)"""
   try:
-    sess: requests.Session = st.session_state["sess"]
+    sess: requests.Session = _get_sess()
     base_url = st.session_state["base_url"].rstrip("/")
     url = base_url + "/inv/stock-account-receipt/top-save"
 
@@ -511,10 +1103,143 @@ def _receipt_top_update_transaction_date(row: Dict[str, Any], new_dt: str) -> bo
   except Exception:
     return False
 
+# ----- (완) 품목명 → 품목코드: 병렬 조회 + 디스크 영속 캐시 + 백그라운드 재검증 -----
+def _item_code_by_name_remote(sess: requests.Session, base_url: str, company_id: Any, plant_id: Any, item_name: str) -> str:
+  if not item_name:
+    return ""
+  payload = {
+    "languageCode":"KO",
+    "companyId": company_id,
+    "status":"Active",
+    "itemPlant": plant_id,
+    "itemCode":"",
+    "itemName": item_name,
+    "itemType":"",
+    "productGroup":"",
+    "buyMake":"",
+    "controlLot":"",
+    "start":1,"page":1,"limit":25
+  }
+  data = _http_post_json(sess, base_url.rstrip("/") + "/base/item/list", payload, timeout=60)
+  lst = (((data or {}).get("data") or {}).get("list")) or []
+  if not lst:
+    return ""
+  return str(lst[0].get("itemCode") or "")
+
+class _NameCodeStore:
+  """'회사|공장|품목명' → {"code", "ts"} JSON 파일 캐시 (재시작 후에도 유지)"""
+  def __init__(self, path: str):
+    self.path = path
+    self._lock = threading.Lock()
+    self._inflight: Set[str] = set()   # 백그라운드 재검증 중인 키
+    try:
+      with open(path, "r", encoding="utf-8") as f:
+        self._data: Dict[str, Dict[str, Any]] = json.load(f)
+    except Exception:
+      self._data = {}
+
+  def get(self, key: str) -> Optional[Dict[str, Any]]:
+    with self._lock:
+      return self._data.get(key)
+
+  def put_many(self, entries: Dict[str, str]) -> None:
+    if not entries:
+      return
+    now = time.time()
+    with self._lock:
+      for k, code in entries.items():
+        self._data[k] = {"code": code, "ts": now}
+      try:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+          json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+      except OSError:
+        pass  # 디스크 저장 실패 시에도 메모리 캐시는 유지
+
+  def claim(self, keys: List[str]) -> List[str]:
+    """재검증 대상 중 다른 스레드가 처리하지 않는 키만 점유해 반환"""
+    with self._lock:
+      mine = [k for k in keys if k not in self._inflight]
+      self._inflight.update(mine)
+      return mine
+
+  def release(self, keys: List[str]) -> None:
+    with self._lock:
+      self._inflight.difference_update(keys)
+
+@st.cache_resource
+def _name_code_store() -> _NameCodeStore:
+  return _NameCodeStore(NAME_CODE_CACHE_PATH)
+
+def _revalidate_name_codes_bg(keys: List[str], names: List[str], cookies: Any, base_url: str,
+                              company_id: Any, plant_id: Any) -> None:
+  """오래된 캐시 항목을 백그라운드 스레드에서 다시 조회(세션 상태는 사용하지 않음)"""
+  store = _name_code_store()
+  def _run():
+    sess = requests.Session()
+    if cookies is not None:
+      sess.cookies.update(cookies)
+    try:
+      fresh: Dict[str, str] = {}
+      for k, nm in zip(keys, names):
+        try:
+          code = _item_code_by_name_remote(sess, base_url, company_id, plant_id, nm)
+        except requests.RequestException:
+          continue
+        if code:
+          fresh[k] = code
+      store.put_many(fresh)
+    finally:
+      sess.close()
+      store.release(keys)
+  threading.Thread(target=_run, name="name-code-revalidate", daemon=True).start()
+
+def _resolve_item_codes_by_name(names: List[str]) -> Tuple[Dict[str, str], List[str]]:
+  """품목명 목록 → 품목코드. 캐시 항목은 즉시 반환(오래된 것은 백그라운드 재검증),
+  나머지는 병렬 조회 후 캐시에 저장. (결과, 오류 메시지 목록) 반환"""
+  store = _name_code_store()
+  company_id, plant_id, *_ = _context_ids()
+  base_url = st.session_state["base_url"]
+  prefix = f"{company_id}|{plant_id}|"
+  out: Dict[str, str] = {}
+  misses: List[str] = []
+  stale: List[str] = []
+  now = time.time()
+  for nm in names:
+    ent = store.get(prefix + nm)
+    if ent and ent.get("code"):
+      out[nm] = str(ent["code"])
+      if now - float(ent.get("ts") or 0) > NAME_CODE_REVALIDATE_SEC:
+        stale.append(nm)
+    else:
+      misses.append(nm)
+
+  errors: List[str] = []
+  def _lookup(nm: str) -> Optional[str]:
+    try:
+      return _item_code_by_name_remote(_get_sess(), base_url, company_id, plant_id, nm)
+    except requests.RequestException as e:
+      errors.append(f"{nm}: {e}")
+      return None
+  found = _parallel_map(_lookup, misses)
+  store.put_many({prefix + nm: code for nm, code in zip(misses, found) if code})
+  for nm, code in zip(misses, found):
+    out[nm] = code or ""
+
+  stale_keys = store.claim([prefix + nm for nm in stale])
+  if stale_keys:
+    base_sess = st.session_state["sess"]
+    _revalidate_name_codes_bg(stale_keys, [k[len(prefix):] for k in stale_keys],
+                              base_sess.cookies.copy() if base_sess is not None else None,
+                              base_url, company_id, plant_id)
+  return out, errors
+
 # ----- 기타입고(저장 + 전송) -----
-def _plant_item_list(q_code:str="", q_name:str="")->pd.DataFrame:
+def _plant_item_list_remote(q_code:str="", q_name:str="")->pd.DataFrame:
   try:
-    sess=st.session_state["sess"]; base=st.session_state["base_url"].rstrip("/")
+    sess=_get_sess(); base=st.session_state["base_url"].rstrip("/")
     company_id, plant_id, *_=_context_ids()
     data=_http_post_json(sess, base+"/base/combo/plant-item-list",
       {"companyId":company_id,"plantId":plant_id,"controlLotSerial":"","makeOrBuy":"",
@@ -525,15 +1250,58 @@ def _plant_item_list(q_code:str="", q_name:str="")->pd.DataFrame:
   except:
     return pd.DataFrame()
 
+@st.cache_resource
+def _item_master_cache() -> _TTLCache:
+  """(companyId, plantId, itemCode) → plant-item-list 결과. 프로세스 공유, TTL + LRU"""
+  return _TTLCache(ITEM_CACHE_TTL_SEC, max_size=ITEM_CACHE_MAX)
+
+CACHE_PANEL["품목 마스터"] = _item_master_cache
+
+def _item_cache_key(q_code: str) -> Tuple[Any, Any, str]:
+  company_id, plant_id, *_ = _context_ids()
+  return (company_id, plant_id, q_code)
+
+def _plant_item_list(q_code:str="", q_name:str="")->pd.DataFrame:
+  # 코드 단건 조회만 캐시(이름 검색은 그대로 서버 조회). 반환 DataFrame은 읽기 전용으로 사용
+  if not q_code or q_name:
+    return _plant_item_list_remote(q_code, q_name)
+  cache = _item_master_cache()
+  key = _item_cache_key(q_code)
+  hit, df = cache.get(key)
+  if hit:
+    return df
+  df = _plant_item_list_remote(q_code)
+  if not df.empty:   # 실패/빈 결과는 캐시하지 않음
+    cache.put(key, df)
+  return df
+
+def _prefetch_plant_items(codes: List[str]) -> None:
+  """캐시에 없는 품목코드만 병렬로 미리 조회해 채움"""
+  cache = _item_master_cache()
+  misses = sorted({str(c) for c in codes if c and not cache.has(_item_cache_key(str(c)))})
+  if misses:
+    _parallel_map(_plant_item_list, misses)
+
+def _plant_item_rows(codes: List[str]) -> pd.DataFrame:
+  """고유 품목코드별 첫 품목행(itemId·UOM)을 캐시/병렬 조회해 한 표로 반환. 없는 코드는 제외"""
+  uniq = sorted({str(c) for c in codes if c})
+  frames = _parallel_map(_plant_item_list, uniq) if uniq else []
+  rows = [
+    {"itemCode": c, "itemId": _to_int_safe(df.iloc[0].get("itemId"), 0),
+     "primaryUom": str(df.iloc[0].get("primaryUom") or ""), "secondaryUom": str(df.iloc[0].get("secondaryUom") or "")}
+    for c, df in zip(uniq, frames) if not df.empty
+  ]
+  return pd.DataFrame(rows, columns=["itemCode", "itemId", "primaryUom", "secondaryUom"])
+
 def _receipt_top_save(header_rows:List[Dict[str,Any]])->bool:
-  sess=st.session_state["sess"]; base=st.session_state["base_url"].rstrip("/")
+  sess=_get_sess(); base=st.session_state["base_url"].rstrip("/")
   data=_http_post_json(sess, base+"/inv/stock-account-receipt/top-save",
     {"recordsIMain":json.dumps(header_rows, ensure_ascii=False),"recordsUMain":"[]","recordsDMain":"[]",
      "menuTreeId":"13650","languageCode":"KO","companyCode":_context_ids()[2],"companyId":_context_ids()[0]}, timeout=90)
   return bool((data or {}).get("success"))
 
 def _receipt_top_list(ymd:str)->pd.DataFrame:
-  sess=st.session_state["sess"]; base=st.session_state["base_url"].rstrip("/")
+  sess=_get_sess(); base=st.session_state["base_url"].rstrip("/")
   company_id, plant_id, *_=_context_ids()
   data=_http_post_json(sess, base+"/inv/stock-account-receipt/top-list",
     {"languageCode":"KO","companyId":company_id,"plantId":plant_id,"transactionTypeCode":"",
@@ -543,7 +1311,7 @@ def _receipt_top_list(ymd:str)->pd.DataFrame:
   return pd.DataFrame((((data or {}).get("data") or {}).get("list")) or [])
 
 def _receipt_bottom_save(records: List[Dict[str, Any]]) -> Tuple[bool, str]:
-  sess = st.session_state["sess"]; base = st.session_state["base_url"].rstrip("/")
+  sess = _get_sess(); base = st.session_state["base_url"].rstrip("/")
   data = _http_post_json(
     sess, base + "/inv/stock-account-receipt/bottom-save",
     {
@@ -562,7 +1330,7 @@ def _receipt_bottom_save(records: List[Dict[str, Any]]) -> Tuple[bool, str]:
   return ok, msg
 
 def _receipt_menugrid_data_cnt(account_result_id:int)->int:
-  sess=st.session_state["sess"]; base=st.session_state["base_url"].rstrip("/")
+  sess=_get_sess(); base=st.session_state["base_url"].rstrip("/")
   company_id, plant_id, company_code, _=_context_ids()
   data=_http_post_json(sess, base+"/inv/stock-account-receipt/menugrid-data-cnt",
     {"companyId":company_id,"plantId":plant_id,"accountResultId":int(account_result_id),
@@ -571,7 +1339,7 @@ def _receipt_menugrid_data_cnt(account_result_id:int)->int:
   return int((lst[0] or {}).get("dataCnt") or 0) if lst else 0
 
 def _receipt_bottom_transmit_proc()->bool:
-  sess=st.session_state["sess"]; base=st.session_state["base_url"].rstrip("/")
+  sess=_get_sess(); base=st.session_state["base_url"].rstrip("/")
   company_id, _, company_code, _=_context_ids()
   data=_http_post_json(sess, base+"/inv/stock-account-receipt/bottom-transmit-proc",
     {"recordsI":"[]","recordsU":"[]","recordsD":"[]","menuTreeId":"13650",
@@ -579,7 +1347,7 @@ def _receipt_bottom_transmit_proc()->bool:
   return bool((data or {}).get("success"))
 
 def _receipt_top_transmit_proc(top_row:Dict[str,Any])->bool:
-  sess=st.session_state["sess"]; base=st.session_state["base_url"].rstrip("/")
+  sess=_get_sess(); base=st.session_state["base_url"].rstrip("/")
   payload = {
     "recordsIMain": json.dumps([top_row], ensure_ascii=False),
     "recordsUMain": json.dumps([top_row], ensure_ascii=False),
@@ -607,6 +1375,775 @@ def _receipt_transmit(account_result_id:int, ymd:str)->bool:
     return False
   ok_top = _receipt_top_transmit_proc(row)
   return ok_top
+# ----- 재고(LOT별) 조회: detail-list 페이지 단위 조회 -----
+LOT_FETCH_MAX_ROWS = 20000  # 페이지 조회 시 서버에서 받을 최대 원본 행 수(안전장치)
+
+def _onhand_detail_payload(q_wh: str, q_item_code: str, q_item_name: str, q_lot: str,
+                           limit: int, page: int = 1) -> Dict[str, Any]:
+  company_id, plant_id, *_ = _context_ids()
+  limit = int(limit)
+  return {
+    "languageCode": "KO",
+    "companyId": company_id,
+    "plantId": plant_id,
+    "itemCode": _with_leading_percent(q_item_code),
+    "itemName": "" if _is_chosung_term(q_item_name or "") else _with_leading_percent(q_item_name),  # 초성은 로컬 필터로
+    "itemType": "",
+    "projectCode": "",
+    "projectName": "",
+    "productGroup": "",
+    "itemClass1": "",
+    "itemClass2": "",
+    "warehouseCode": "",
+    "warehouseName": _with_leading_percent(q_wh),
+    "warehouseLocationCode": "",
+    "defectiveFlag": "Y",
+    "itemClass3": "",
+    "itemClass4": "",
+    "effectiveDateFrom": "",
+    "effectiveDateTo": "",
+    "creationDateFrom": "",
+    "creationDateTo": "",
+    "lotStatus": "",
+    "lotCode": _with_leading_percent(q_lot),
+    "jobName": "",
+    "partnerItem": "",
+    "peopleName": "",
+    "start": (int(page) - 1) * limit + 1,
+    "page": int(page),
+    "limit": str(limit),
+  }
+
+# 앱에서 실제로 쓰는 detail-list 컬럼(그리드 표시 · 카트 · 미리보기 · 출고/입고 · 라벨)
+ONHAND_KEEP_COLS = [
+  "warehouseId", "warehouseCode", "warehouseName",
+  "itemId", "itemCode", "itemName", "itemType",
+  "lotId", "lotCode", "lotStatus",
+  "primaryUom", "onhandQuantity", "secondaryUom", "secondaryQuantity",
+  "effectiveStartDate", "effectiveEndDate",
+]
+ONHAND_FLOAT_COLS = ("onhandQuantity", "secondaryQuantity")
+
+# LOT 행 스키마: 컬럼 → (종류, null 허용). 조회·불러오기 시 한 번 정규화하고 이후 경로는 재변환하지 않는다.
+# int는 누락 시 0, 비허용 float는 0.0, 비허용 str은 ""로 채우고, 허용 컬럼은 NaN/None을 그대로 둔다.
+LOT_SCHEMA: Dict[str, Tuple[str, bool]] = {
+  **{c: ("int", False) for c in ("warehouseId", "itemId", "lotId", "accountResultId")},
+  "onhandQuantity": ("float", False),
+  "_after_onhandQuantity": ("float", False),
+  "secondaryQuantity": ("float", True),
+  **{c: ("str", False) for c in ("warehouseCode", "warehouseName", "itemCode", "itemName", "itemType",
+                                 "lotCode", "lotStatus", "primaryUom", "secondaryUom",
+                                 "_after_warehouseName", "_after_itemCode", "_after_itemName",
+                                 "_after_lotCode", "_after_primaryUom")},
+  **{c: ("str", True) for c in ("effectiveStartDate", "effectiveEndDate")},
+}
+
+# 변환 LOT 형식: 품목코드 7자리-창고 2자리-YYMMDD+순번 3자리
+LOT_PARTS_RE = r"^(?P<code7>[^-]{7})-(?P<wc2>[^-]{2})-(?P<ymd>\d{6})(?P<seq>\d{3})$"
+LOT_YMD_RE = r"-[A-Za-z0-9]{2}-(\d{6})\d{3}$"
+
+def _lot_parts(lots: pd.Series) -> pd.DataFrame:
+  """LOT 문자열을 code7·wc2·ymd·seq 컬럼으로 분해(형식이 다르면 NaN)"""
+  return lots.astype(str).str.extract(LOT_PARTS_RE)
+
+def _normalize_lot_frame(df: pd.DataFrame) -> pd.DataFrame:
+  """LOT_SCHEMA에 있는 컬럼을 정수 ID·실수 수량·문자열 코드로 변환(이미 맞는 타입은 그대로)"""
+  conv: Dict[str, pd.Series] = {}
+  for c, (kind, nullable) in LOT_SCHEMA.items():
+    if c not in df.columns:
+      continue
+    s = df[c]
+    if kind == "int":
+      if s.dtype != np.int64:
+        conv[c] = pd.to_numeric(s, errors="coerce").fillna(0).astype(np.int64)
+    elif kind == "float":
+      if s.dtype != np.float64:
+        s = pd.to_numeric(s, errors="coerce").astype(np.float64)
+      if not nullable and s.isna().any():
+        s = s.fillna(0.0)
+      if s is not df[c]:
+        conv[c] = s
+    elif not isinstance(s.dtype, pd.CategoricalDtype):   # category는 이미 정규화된 문자열
+      conv[c] = s.where(s.isna(), s.astype(str)) if nullable else s.fillna("").astype(str)
+  return df.assign(**conv) if conv else df
+
+def _fetch_onhand_frame(payload: Dict[str, Any], timeout: int = 90) -> pd.DataFrame:
+  sess: requests.Session = _get_sess()
+  url = st.session_state["base_url"].rstrip("/") + "/inv/stock-onhand-lot/detail-list"
+  return _compact_frame(_normalize_lot_frame(
+    _http_post_list_frame(sess, url, payload, ONHAND_KEEP_COLS, ONHAND_FLOAT_COLS, timeout=timeout)))
+
+def _page_signature(df: pd.DataFrame) -> Tuple[Any, ...]:
+  if df.empty:
+    return ()
+  f, l = df.iloc[0], df.iloc[-1]
+  return (f.get("lotCode"), f.get("itemCode"), f.get("warehouseName"), l.get("lotCode"), l.get("itemCode"), len(df))
+
+# ---- OR 검색어(또는, |, ,) 서버 분할 조회 ----
+OR_QUERY_MAX = 16  # 필드별 OR 조합으로 만들 서버 하위 조회 최대 개수
+
+def _plan_or_queries(conds: Dict[str, str]) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+  """필드별 OR 항목을 단일 항목 하위 조회들로 펼친다.
+  조합 수가 OR_QUERY_MAX를 넘으면 항목이 많은 필드부터 서버 조건에서 빼고(빈 값) 로컬 필터로 넘긴다.
+  (하위 조회 조건 목록, 로컬에서 걸러야 할 잔여 조건) 반환"""
+  pushed = {f: _split_or_terms(v) for f, v in conds.items() if _split_or_terms(v)}
+  residual: Dict[str, str] = {}
+  # 초성 검색어는 서버 LIKE로 찾을 수 없으므로 해당 필드 전체를 로컬 필터로
+  for f in [f for f in pushed if f in _CHOSUNG_COLS and any(_is_chosung_term(t) for t in pushed[f])]:
+    residual[f] = conds[f]
+    del pushed[f]
+  def _combos() -> int:
+    n = 1
+    for t in pushed.values():
+      n *= len(t)
+    return n
+  while pushed and _combos() > OR_QUERY_MAX:
+    f = max(pushed, key=lambda k: len(pushed[k]))
+    residual[f] = conds[f]
+    del pushed[f]
+  fields = list(pushed)
+  queries = []
+  for combo in itertools.product(*[pushed[f] for f in fields]):
+    q = {f: "" for f in conds}
+    q.update(dict(zip(fields, combo)))
+    queries.append(q)
+  return (queries or [{f: "" for f in conds}]), residual
+
+def _fetch_onhand_until(q: Dict[str, str], local: Dict[str, str], limit: int,
+                        page_through: bool) -> Tuple[pd.DataFrame, bool]:
+  """서버 조건 q로 조회 후 local 조건으로 로컬 필터.
+  page_through면(서버가 못 거르는 초성·OR 잔여 조건) 걸러진 결과가 limit건이 될 때까지 페이지를 이어 받는다.
+  (결과, 원본 LOT_FETCH_MAX_ROWS건 상한에서 멈춰 일부만 받았는지) 반환"""
+  limit = int(limit)
+  out: List[pd.DataFrame] = []
+  got, raw, prev_sig, capped = 0, 0, None, False
+  for page in range(1, LOT_FETCH_MAX_ROWS // max(limit, 1) + 2):
+    page_df = _fetch_onhand_frame(_onhand_detail_payload(q["warehouseName"], q["itemCode"], q["itemName"],
+                                                         q["lotCode"], limit, page=page))
+    sig = _page_signature(page_df)
+    if page_df.empty or sig == prev_sig:   # 마지막 페이지 이후 / 서버가 page를 무시하는 경우
+      break
+    add = _apply_client_filters(page_df, local)
+    out.append(add)
+    got, raw, prev_sig = got + len(add), raw + len(page_df), sig
+    if not page_through or got >= limit or len(page_df) < limit:
+      break
+    if raw >= LOT_FETCH_MAX_ROWS:
+      capped = True
+      break
+  if not out:
+    return pd.DataFrame(), capped
+  df = pd.concat(out, ignore_index=True) if len(out) > 1 else out[0]
+  return df.iloc[:limit].reset_index(drop=True), capped
+
+def _fetch_onhand_or_frame(conds: Dict[str, str], limit: int) -> Tuple[pd.DataFrame, bool]:
+  """OR 하위 조회를 병렬 실행 → 합치기 → lotCode|itemCode 중복 제거 → 잔여 조건만 로컬 필터"""
+  queries, residual = _plan_or_queries(conds)
+  parts = _parallel_map(lambda q: _fetch_onhand_until(q, residual, int(limit), bool(residual)), queries)
+  capped = any(c for _, c in parts)
+  frames = [f for f, _ in parts if not f.empty]
+  if not frames:
+    return pd.DataFrame(), capped
+  df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+  if {"lotCode", "itemCode"} <= set(df.columns):
+    df = df.drop_duplicates(subset=["lotCode", "itemCode"], keep="first")
+  return df.iloc[:int(limit)].reset_index(drop=True), capped
+
+# ---- 재고 조회 결과 캐시: 짧은 TTL + stale-while-revalidate + 입출고 시 무효화 ----
+class _SWRCache(_TTLCache):
+  """값은 (조회시각 epoch, DataFrame). 백그라운드 갱신 중복 방지용 점유 표시 포함.
+  generation은 무효화 때마다 증가: 무효화 전에 시작한 조회 결과는 put_if_current에서 버린다"""
+  def __init__(self, ttl_sec: float, max_size: int = 0):
+    super().__init__(ttl_sec, max_size)
+    self._refreshing: Set[Any] = set()
+    self.generation = 0
+
+  def bump_generation(self) -> int:
+    with self._lock:
+      self.generation += 1
+      return self.generation
+
+  def put_if_current(self, key: Any, value: Any, generation: int) -> bool:
+    """조회 시작 시점의 generation이 그대로일 때만 저장"""
+    with self._lock:
+      if generation != self.generation:
+        return False
+      self._put_locked(key, value)
+      return True
+
+  def claim(self, key: Any) -> bool:
+    with self._lock:
+      if key in self._refreshing:
+        return False
+      self._refreshing.add(key)
+      return True
+
+  def release(self, key: Any) -> None:
+    with self._lock:
+      self._refreshing.discard(key)
+
+  def is_refreshing(self, key: Any) -> bool:
+    with self._lock:
+      return key in self._refreshing
+
+@st.cache_resource
+def _onhand_result_cache() -> _SWRCache:
+  return _SWRCache(ONHAND_CACHE_STALE_SEC, max_size=ONHAND_CACHE_MAX)
+
+CACHE_PANEL["재고 조회 결과"] = _onhand_result_cache
+
+_ONHAND_FIELDS = ("warehouseName", "itemCode", "itemName", "lotCode")
+_ONHAND_KEY_CTX = 4   # 키 앞부분 (회사, 공장, 사용자, 권한) — 권한별로 조회 범위가 다를 수 있어 공유하지 않음
+
+def _user_scope() -> Tuple[Any, Any]:
+  """(사용자, 권한) — 권한별 조회 범위가 다를 수 있는 재고 결과를 나눠 담는 단위"""
+  _, _, _, user_id = _context_ids()
+  return user_id, st.session_state["user_info"].get("authorityId") or 10033   # 프로필 조회와 같은 기본값
+
+def _onhand_cache_key(conds: Dict[str, str], limit: int) -> Tuple[Any, ...]:
+  company_id, plant_id, *_ = _context_ids()
+  user_id, authority_id = _user_scope()
+  return ((company_id, plant_id, user_id, authority_id)
+          + tuple(str(conds.get(f) or "").strip() for f in _ONHAND_FIELDS) + (int(limit),))
+
+def _onhand_key_conds(key: Tuple[Any, ...]) -> Dict[str, str]:
+  return dict(zip(_ONHAND_FIELDS, key[_ONHAND_KEY_CTX:_ONHAND_KEY_CTX + len(_ONHAND_FIELDS)]))
+
+def _onhand_cache_store(key: Tuple[Any, ...], df: pd.DataFrame, generation: Optional[int] = None) -> None:
+  """generation을 주면 그 사이 무효화가 있었을 때 캐시에 넣지 않음(화면 표시는 그대로)"""
+  ts = time.time()
+  cache = _onhand_result_cache()
+  if generation is None:
+    cache.put(key, (ts, df))
+  elif not cache.put_if_current(key, (ts, df), generation):
+    st.session_state["lot_cache_info"] = None
+    return
+  st.session_state["lot_cache_info"] = {"key": key, "ts": ts, "hit": False}
+
+def _fetch_lot_result(conds: Dict[str, str], limit: int) -> Tuple[pd.DataFrame, bool]:
+  """한 번에 받는 전체 조회(OR 분할 포함). 백그라운드 갱신에서도 사용.
+  (결과, 초성 등 로컬 필터 조회가 원본 상한에서 멈춰 일부만 받았는지) 반환"""
+  if any(len(_split_or_terms(v)) > 1 for v in conds.values()):
+    return _fetch_onhand_or_frame(conds, int(limit))
+  return _fetch_onhand_until(conds, conds, int(limit), _has_chosung_cond(conds))
+
+def _refresh_onhand_cache_bg(key: Tuple[Any, ...], conds: Dict[str, str], limit: int) -> None:
+  cache = _onhand_result_cache()
+  if not cache.claim(key):
+    return
+  gen = cache.generation
+  def _job():
+    try:
+      # 조회 중에 입출고 무효화가 있었으면 결과를 버림(갱신 전 재고로 패치된 화면을 덮지 않도록)
+      cache.put_if_current(key, (time.time(), _fetch_lot_result(conds, limit)[0]), gen)
+    finally:
+      cache.release(key)
+  _run_in_background(_job, name="onhand-refresh")
+
+def _onhand_cache_lookup(conds: Dict[str, str], limit: int) -> Optional[pd.DataFrame]:
+  """캐시 결과가 있으면 반환(오래된 결과면 백그라운드 갱신 시작), 없으면 None"""
+  key = _onhand_cache_key(conds, limit)
+  hit, val = _onhand_result_cache().get(key)
+  if not hit:
+    return None
+  ts, df = val
+  st.session_state["lot_cache_info"] = {"key": key, "ts": ts, "hit": True}
+  if time.time() - ts > ONHAND_CACHE_FRESH_SEC:
+    _refresh_onhand_cache_bg(key, dict(conds), int(limit))
+  return df
+
+def _adopt_refreshed_onhand() -> None:
+  """현재 표시 중인 조회 결과가 백그라운드에서 갱신됐으면 lot_df를 새 결과로 교체"""
+  info = st.session_state.get("lot_cache_info")
+  if not info or st.session_state.get("lot_fetch_state"):
+    return
+  ok, val = _onhand_result_cache().get(info["key"])
+  if ok and val[0] > info["ts"]:
+    _snap_put("lot_df", val[1])
+    st.session_state["lot_cache_info"] = dict(info, ts=val[0])
+
+def _invalidate_onhand_cache(touched: pd.DataFrame) -> int:
+  """입출고로 바뀐 LOT 행(lotCode·itemCode·itemName·warehouseName)이 결과에 있거나
+  검색조건에 걸리는 캐시 항목만 삭제"""
+  if touched.empty:
+    return 0
+  cache = _onhand_result_cache()
+  cache.bump_generation()
+  keys_touched: Set[Tuple[str, str]] = set()
+  if {"lotCode", "itemCode"} <= set(touched.columns):
+    keys_touched = set(zip(touched["lotCode"].astype(str), touched["itemCode"].astype(str)))
+  doomed: Set[Any] = set()
+  for key, (_, df) in cache.items():
+    conds = _onhand_key_conds(key)
+    if not _apply_client_filters(touched, conds).empty:
+      doomed.add(key)
+    elif keys_touched and {"lotCode", "itemCode"} <= set(df.columns):
+      if not keys_touched.isdisjoint(zip(df["lotCode"].astype(str), df["itemCode"].astype(str))):
+        doomed.add(key)
+  n = cache.invalidate(lambda k: k in doomed)
+  info = st.session_state.get("lot_cache_info")
+  if info and info["key"] in doomed:
+    st.session_state["lot_cache_info"] = None
+  return n
+
+# ---- 입출고 후 영향받은 LOT 행만 다시 조회해 lot_df에 반영 ----
+LOT_REFRESH_LIMIT = 1000  # (품목, 창고) 1건당 재조회 최대 행 수
+
+def _current_search_conds() -> Dict[str, str]:
+  return {
+    "warehouseName": st.session_state.get("q_wh", ""),
+    "itemCode": st.session_state.get("q_item_code", ""),
+    "itemName": st.session_state.get("q_item_name", ""),
+    "lotCode": st.session_state.get("q_lot", ""),
+  }
+
+def _lot_key_series(df: pd.DataFrame) -> pd.Series:
+  return df["lotCode"].astype(str) + "|" + df["itemCode"].astype(str)
+
+def _refresh_lot_rows(touched: pd.DataFrame) -> Tuple[int, int, int]:
+  """touched(lotCode·itemCode·warehouseName) 키만 (품목, 창고) 단위로 재조회해 lot_df 갱신.
+  소진된 LOT는 제거, 새 LOT는 현재 검색조건에 맞을 때만 추가. (갱신, 제거, 추가) 건수 반환"""
+  if touched.empty or not {"lotCode", "itemCode", "warehouseName"} <= set(touched.columns):
+    return 0, 0, 0
+  want = set(_lot_key_series(touched))
+  groups = list(touched[["itemCode", "warehouseName"]].astype(str).drop_duplicates().itertuples(index=False, name=None))
+  frames = _parallel_map(
+    lambda g: _fetch_onhand_frame(_onhand_detail_payload(g[1], g[0], "", "", LOT_REFRESH_LIMIT)),
+    groups,
+  )
+  frames = [f for f in frames if not f.empty and {"lotCode", "itemCode"} <= set(f.columns)]
+  fresh = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["lotCode", "itemCode"])
+  fresh_k = _lot_key_series(fresh)
+  qty = fresh["onhandQuantity"] if "onhandQuantity" in fresh.columns else pd.Series(0.0, index=fresh.index)
+  keep = fresh_k.isin(want) & (qty > 0)
+  fresh, fresh_k = fresh[keep], fresh_k[keep]
+  dup = fresh_k.duplicated()
+  fresh = fresh[~dup].set_index(fresh_k[~dup])
+
+  # 로컬 복제본을 쓰는 중이면 같은 변경분을 반영(증분 갱신). 실패해도 화면 갱신은 계속
+  replica = _replica_if_enabled()
+  if replica is not None:
+    company_id, plant_id, *_ = _context_ids()
+    try:
+      replica.apply_delta(company_id, plant_id, want, fresh.reset_index(drop=True))
+    except (OSError, sqlite3.Error) as e:
+      st.warning(f"로컬 복제본 증분 반영 실패(다음 동기화 때 반영): {e}")
+
+  cur = st.session_state["lot_df"]
+  if cur.empty or not {"lotCode", "itemCode"} <= set(cur.columns):
+    cur_k = pd.Series([], dtype=str)
+    base = cur.iloc[0:0]
+    n_upd = n_del = 0
+  else:
+    cur_k = _lot_key_series(cur)
+    hit = cur_k.isin(want)
+    alive = cur_k.isin(fresh.index)
+    base = cur[~(hit & ~alive)]
+    upd = (hit & alive)[base.index]
+    upd_keys = cur_k[base.index][upd]
+    for c in [c for c in base.columns if c in fresh.columns]:
+      if isinstance(base[c].dtype, pd.CategoricalDtype):   # 새 값이 범주에 없을 수 있음
+        base[c] = base[c].astype(object)
+      base.loc[upd, c] = fresh.loc[upd_keys.values, c].values
+    n_upd, n_del = int(upd.sum()), int((hit & ~alive).sum())
+
+  new_rows = fresh[~fresh.index.isin(cur_k)].reset_index(drop=True)
+  new_rows = _apply_client_filters(new_rows, _current_search_conds())
+  out = pd.concat([base, new_rows], ignore_index=True) if not new_rows.empty else base.reset_index(drop=True)
+  _snap_put("lot_df", _compact_frame(out))
+  return n_upd, n_del, len(new_rows)
+
+def _start_paged_lot_fetch(conds: Dict[str, str], page_size: int, target: int) -> None:
+  """1페이지를 받아 바로 lot_df에 반영하고, 더 받을 페이지가 있으면 이어받기 상태를 남긴다."""
+  payload = _onhand_detail_payload(conds["warehouseName"], conds["itemCode"], conds["itemName"],
+                                   conds["lotCode"], page_size, page=1)
+  gen = _onhand_result_cache().generation
+  page_df = _fetch_onhand_frame(payload)
+  df = _apply_client_filters(page_df, conds)
+  _snap_put("lot_df", df)
+  more = len(page_df) >= int(page_size) and len(df) < int(target)
+  st.session_state["lot_fetch_state"] = {
+    "conds": dict(conds), "page_size": int(page_size), "target": int(target),
+    "next_page": 2, "raw": len(page_df), "sig": _page_signature(page_df), "gen": gen,
+  } if more else None
+  if not more:
+    _onhand_cache_store(_onhand_cache_key(conds, target), df, gen)
+
+def _continue_paged_lot_fetch() -> bool:
+  """다음 페이지 1개를 받아 lot_df 뒤에 붙임. 더 받을 페이지가 남으면 True."""
+  state = st.session_state.get("lot_fetch_state")
+  if not state:
+    return False
+  conds = state["conds"]
+  payload = _onhand_detail_payload(conds["warehouseName"], conds["itemCode"], conds["itemName"],
+                                   conds["lotCode"], state["page_size"], page=state["next_page"])
+  page_df = _fetch_onhand_frame(payload)
+  sig = _page_signature(page_df)
+  if page_df.empty or sig == state["sig"]:   # 마지막 페이지 이후 / 서버가 page를 무시하는 경우
+    st.session_state["lot_fetch_state"] = None
+    _onhand_cache_store(_onhand_cache_key(conds, state["target"]), st.session_state["lot_df"], state.get("gen"))
+    return False
+  add = _apply_client_filters(page_df, conds)
+  cur = st.session_state["lot_df"]
+  df = pd.concat([cur, add], ignore_index=True) if not cur.empty else add.reset_index(drop=True)
+  target = state["target"]
+  if len(df) > target:
+    df = df.iloc[:target]
+  _snap_put("lot_df", df)
+  state = dict(state, next_page=state["next_page"] + 1, raw=state["raw"] + len(page_df), sig=sig)
+  more = (len(page_df) >= state["page_size"] and len(df) < target and state["raw"] < LOT_FETCH_MAX_ROWS)
+  # 원본 상한에서 멈췄는데 목표 건수를 못 채웠으면 일부 결과임을 표시
+  st.session_state["lot_fetch_capped"] = (len(page_df) >= state["page_size"] and len(df) < target
+                                          and state["raw"] >= LOT_FETCH_MAX_ROWS)
+  st.session_state["lot_fetch_state"] = state if more else None
+  if not more:
+    _onhand_cache_store(_onhand_cache_key(conds, target), df, state.get("gen"))
+  return more
+
+# ---- 재고(LOT별) 로컬 SQLite 복제본: 백그라운드 전체 동기화 + 입출고 증분 반영 ----
+_REPLICA_INT_COLS = ("warehouseId", "itemId", "lotId")
+
+class _OnhandReplica:
+  """공장 재고(LOT별)를 detail-list 페이지 조회로 받아 두는 로컬 복제본.
+  동기화는 세대(gen) 단위로 쌓고 끝나면 한 번에 교체하므로 동기화 중에도 이전 세대로 조회 가능"""
+  def __init__(self, path: str):
+    self.path = path
+    self._lock = threading.Lock()
+    self._syncing: Set[Tuple[Any, Any]] = set()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    col_defs = ", ".join(
+      f'"{c}" ' + ("REAL" if c in ONHAND_FLOAT_COLS else "INTEGER" if c in _REPLICA_INT_COLS else "TEXT")
+      for c in ONHAND_KEEP_COLS
+    )
+    with closing(self._connect()) as cx, cx:
+      cx.execute("PRAGMA journal_mode=WAL")
+      cx.execute(f"CREATE TABLE IF NOT EXISTS onhand_lot (company_id INTEGER, plant_id INTEGER, gen INTEGER, {col_defs})")
+      cx.execute("CREATE TABLE IF NOT EXISTS replica_meta (company_id INTEGER, plant_id INTEGER, gen INTEGER, "
+                 "synced_at REAL, row_count INTEGER, complete INTEGER, last_error TEXT, error_at REAL, "
+                 "PRIMARY KEY (company_id, plant_id))")
+      have = {r[1] for r in cx.execute("PRAGMA table_info(replica_meta)")}
+      for col, typ in (("complete", "INTEGER"), ("last_error", "TEXT"), ("error_at", "REAL")):
+        if col not in have:
+          cx.execute(f"ALTER TABLE replica_meta ADD COLUMN {col} {typ}")   # 이전 스키마 DB
+      cx.execute("CREATE INDEX IF NOT EXISTS ix_onhand_gen ON onhand_lot (company_id, plant_id, gen)")
+      for c in ("itemCode", "itemName", "lotCode", "warehouseName"):
+        cx.execute(f'CREATE INDEX IF NOT EXISTS ix_onhand_{c} ON onhand_lot (company_id, plant_id, "{c}")')
+
+  def _connect(self) -> sqlite3.Connection:
+    return sqlite3.connect(self.path, timeout=30)
+
+  def _insert(self, cx: sqlite3.Connection, company_id: Any, plant_id: Any, gen: int, df: pd.DataFrame) -> None:
+    if df.empty:
+      return
+    vals = df.reindex(columns=ONHAND_KEEP_COLS).astype(object)
+    vals = vals.where(pd.notna(vals), None)
+    cols = ", ".join(f'"{c}"' for c in ONHAND_KEEP_COLS)
+    marks = ", ".join("?" for _ in range(len(ONHAND_KEEP_COLS) + 3))
+    cx.executemany(f"INSERT INTO onhand_lot (company_id, plant_id, gen, {cols}) VALUES ({marks})",
+                   [(company_id, plant_id, gen) + tuple(r) for r in vals.itertuples(index=False, name=None)])
+
+  def status(self, company_id: Any, plant_id: Any) -> Optional[Dict[str, Any]]:
+    with closing(self._connect()) as cx:
+      row = cx.execute("SELECT gen, synced_at, row_count, complete, last_error, error_at FROM replica_meta "
+                       "WHERE company_id=? AND plant_id=?", (company_id, plant_id)).fetchone()
+    if not row:
+      return None
+    # gen이 없으면 동기화가 한 번도 성공하지 않은 상태(마지막 오류만 기록됨)
+    return {"gen": row[0], "synced_at": row[1], "row_count": row[2], "complete": bool(row[3]),
+            "last_error": row[4], "error_at": row[5], "ready": row[0] is not None,
+            "syncing": self.is_syncing(company_id, plant_id)}
+
+  def claim(self, company_id: Any, plant_id: Any) -> bool:
+    with self._lock:
+      if (company_id, plant_id) in self._syncing:
+        return False
+      self._syncing.add((company_id, plant_id))
+      return True
+
+  def release(self, company_id: Any, plant_id: Any) -> None:
+    with self._lock:
+      self._syncing.discard((company_id, plant_id))
+
+  def is_syncing(self, company_id: Any, plant_id: Any) -> bool:
+    with self._lock:
+      return (company_id, plant_id) in self._syncing
+
+  def sync_full(self, company_id: Any, plant_id: Any, fetch_page: Callable[[int], pd.DataFrame]) -> int:
+    """전체 페이지를 새 세대로 적재한 뒤 메타의 세대를 교체하고 이전 세대 삭제. 적재 행 수 반환.
+    REPLICA_MAX_ROWS에서 잘리면 메타에 불완전(complete=0)으로 기록"""
+    gen = int(time.time() * 1000)
+    total, prev_sig, complete = 0, None, False
+    try:
+      for page in range(1, REPLICA_MAX_ROWS // REPLICA_PAGE_SIZE + 1):
+        df = fetch_page(page)
+        sig = _page_signature(df)
+        if df.empty or sig == prev_sig:
+          complete = True
+          break
+        with closing(self._connect()) as cx, cx:
+          self._insert(cx, company_id, plant_id, gen, df)
+        total += len(df)
+        prev_sig = sig
+        if len(df) < REPLICA_PAGE_SIZE:
+          complete = True
+          break
+      with closing(self._connect()) as cx, cx:
+        cx.execute("INSERT OR REPLACE INTO replica_meta (company_id, plant_id, gen, synced_at, row_count, complete, "
+                   "last_error, error_at) VALUES (?, ?, ?, ?, ?, ?, NULL, NULL)",
+                   (company_id, plant_id, gen, time.time(), total, int(complete)))
+        cx.execute("DELETE FROM onhand_lot WHERE company_id=? AND plant_id=? AND gen<>?", (company_id, plant_id, gen))
+      return total
+    except Exception as e:
+      with closing(self._connect()) as cx, cx:
+        cx.execute("DELETE FROM onhand_lot WHERE company_id=? AND plant_id=? AND gen=?", (company_id, plant_id, gen))
+        # 백그라운드 예외는 화면에 안 보이므로 마지막 오류를 메타에 남김(이전 세대는 그대로 조회 가능)
+        cx.execute("INSERT INTO replica_meta (company_id, plant_id, last_error, error_at) VALUES (?, ?, ?, ?) "
+                   "ON CONFLICT(company_id, plant_id) DO UPDATE SET last_error=excluded.last_error, error_at=excluded.error_at",
+                   (company_id, plant_id, f"{type(e).__name__}: {e}"[:500], time.time()))
+      raise
+
+  def apply_delta(self, company_id: Any, plant_id: Any, keys: Set[str], fresh: pd.DataFrame) -> None:
+    """lotCode|itemCode 키의 기존 행을 지우고 재조회 결과(fresh)로 대체"""
+    st_ = self.status(company_id, plant_id)
+    if not st_ or not st_["ready"] or not keys:
+      return
+    with closing(self._connect()) as cx, cx:
+      cx.executemany(
+        'DELETE FROM onhand_lot WHERE company_id=? AND plant_id=? AND "lotCode"=? AND "itemCode"=?',
+        [(company_id, plant_id) + tuple(k.split("|", 1)) for k in keys if "|" in k],
+      )
+      self._insert(cx, company_id, plant_id, st_["gen"], fresh)
+
+  def query(self, company_id: Any, plant_id: Any, conds: Dict[str, str], limit: int) -> pd.DataFrame:
+    """검색조건(OR 항목, % 와일드카드 포함)을 LIKE 조건으로 변환해 조회"""
+    st_ = self.status(company_id, plant_id)
+    if not st_ or not st_["ready"]:
+      return pd.DataFrame()
+    where, params = ["company_id=?", "plant_id=?", "gen=?"], [company_id, plant_id, st_["gen"]]
+    local: Dict[str, str] = {}
+    for col, raw in conds.items():
+      terms = _split_or_terms(raw)
+      if not terms:
+        continue
+      if col in _CHOSUNG_COLS and any(_is_chosung_term(t) for t in terms):
+        local[col] = raw   # 초성 검색어는 조회 후 로컬 필터
+        continue
+      likes = []
+      for t in terms:
+        pat = t.replace("\\", "\\\\").replace("_", "\\_")
+        likes.append(f'"{col}" LIKE ? ESCAPE \'\\\'')
+        params.append("%" + pat + "%")
+      where.append("(" + " OR ".join(likes) + ")")
+    cols = ", ".join(f'"{c}"' for c in ONHAND_KEEP_COLS)
+    sql = f"SELECT {cols} FROM onhand_lot WHERE {' AND '.join(where)} LIMIT ?"
+    params.append(REPLICA_MAX_ROWS if local else int(limit))
+    with closing(self._connect()) as cx:
+      df = pd.read_sql_query(sql, cx, params=params)
+    if local:
+      df = _apply_client_filters(df, local).iloc[:int(limit)].reset_index(drop=True)
+    return _compact_frame(_normalize_lot_frame(df.dropna(axis=1, how="all")))
+
+@st.cache_resource
+def _onhand_replica(user_id: Any, authority_id: Any) -> _OnhandReplica:
+  """사용자·권한별 복제본 파일: 동기화는 그 사용자의 로그인으로 받으므로 다른 사용자와 공유하지 않음"""
+  base, ext = os.path.splitext(REPLICA_DB_PATH)
+  return _OnhandReplica(f"{base}_{user_id}_{authority_id}{ext}")
+
+def _replica_if_enabled() -> Optional[_OnhandReplica]:
+  """'로컬 복제본 조회'를 켠 경우에만 복제본을 열어 반환(끄면 DB 파일을 만들지 않음). 열기 실패 시 None"""
+  if not st.session_state.get("q_use_replica"):
+    return None
+  try:
+    return _onhand_replica(*_user_scope())
+  except (OSError, sqlite3.Error) as e:
+    st.warning(f"로컬 복제본을 열 수 없어 서버 조회를 사용합니다: {e}")
+    return None
+
+def _start_replica_sync(replica: _OnhandReplica) -> bool:
+  """현재 회사/공장 복제본 전체 동기화를 백그라운드로 시작(이미 진행 중이면 False)"""
+  company_id, plant_id, *_ = _context_ids()
+  if not replica.claim(company_id, plant_id):
+    return False
+  def _job():
+    try:
+      replica.sync_full(company_id, plant_id, lambda page: _fetch_onhand_frame(
+        _onhand_detail_payload("", "", "", "", REPLICA_PAGE_SIZE, page=page), timeout=120))
+    finally:
+      replica.release(company_id, plant_id)
+  _run_in_background(_job, name="onhand-replica-sync")
+  return True
+
+def _render_replica_status() -> None:
+  replica = _replica_if_enabled()
+  if replica is None:
+    st.caption("로컬 복제본: 사용 안 함")
+    return
+  company_id, plant_id, *_ = _context_ids()
+  try:
+    info = replica.status(company_id, plant_id)
+  except (OSError, sqlite3.Error) as e:
+    st.caption(f"로컬 복제본: 상태 조회 실패({e})")
+    return
+  if info and info["ready"]:
+    age_min = int((time.time() - float(info["synced_at"] or 0)) // 60)
+    st.caption(f"로컬 복제본: {info['row_count']}건 · {age_min}분 전 동기화"
+               + ("" if info["complete"] else f" · ⚠️ 상한({REPLICA_MAX_ROWS}건)에서 잘린 부분 복제본")
+               + (" · 동기화 중" if info["syncing"] else ""))
+  else:
+    st.caption("로컬 복제본: 없음" + (" · 동기화 중" if replica.is_syncing(company_id, plant_id) else ""))
+  if info and info["last_error"]:
+    err_min = int((time.time() - float(info["error_at"] or 0)) // 60)
+    st.caption(f"⚠️ 마지막 동기화 실패({err_min}분 전): {info['last_error']}")
+  if st.button("복제본 동기화", key="btn_replica_sync"):
+    st.toast("복제본 동기화를 시작했습니다." if _start_replica_sync(replica) else "이미 동기화 중입니다.", icon="🔄")
+
+# ---- 세션 메모리 관리: 반복 문자열 category화 + 세션별 한도 + 지난 버전 파생값 정리 ----
+CATEGORY_COLS = ("warehouseCode", "warehouseName", "itemCode", "itemName", "itemType",
+                 "lotStatus", "primaryUom", "secondaryUom")
+_FRAME_MEMO_SLOTS = ("key_indexes", "snap_records", "snap_hashes", "frame_bytes", "grid_orders",
+                     "snap_exports")
+
+def _compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+  """반복이 많은 문자열 컬럼(고유값이 행 수의 절반 미만)을 category로 변환"""
+  if len(df.index) < 64:
+    return df
+  conv = {c: df[c].astype("category") for c in CATEGORY_COLS
+          if c in df.columns and df[c].dtype == object and df[c].nunique(dropna=False) * 2 < len(df.index)}
+  return df.assign(**conv) if conv else df
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+  return _frame_memo("frame_bytes", df, lambda d: int(d.memory_usage(deep=True).sum()))
+
+def _enforce_mem_budget() -> Dict[str, Any]:
+  """현재 표 버전이 아닌 프레임의 파생값(인덱스·해시·records)을 버리고, 한도를 넘으면
+  파생값 전체를 비운 뒤 카트/미리보기도 category로 압축. 그래도 넘으면 다시 만들 수 있는 표부터
+  비운다: 재고 조회 결과(lot_df, 다시 조회) → 미리보기(카트에서 재생성). 카트는 사용자 작업이라 비우지 않음.
+  사용량 요약을 세션에 남기고 반환"""
+  live = {id(st.session_state[n]) for n in SNAPSHOT_KEYS if n in st.session_state}
+  for slot in _FRAME_MEMO_SLOTS:
+    cache = st.session_state.get(slot)
+    if cache is not None:
+      cache.invalidate(lambda k: k not in live)
+  budget = int(st.session_state.get("mem_budget_mb") or SESSION_MEM_BUDGET_MB) * 1024 * 1024
+  tables = {n: _frame_bytes(st.session_state[n]) for n in SNAPSHOT_KEYS if n in st.session_state}
+  evicted = False
+  if sum(tables.values()) > budget:
+    for slot in _FRAME_MEMO_SLOTS:
+      cache = st.session_state.get(slot)
+      if cache is not None:
+        cache.invalidate()
+    for n in ("cart_df", "preview_df_full"):
+      _snap_put(n, _compact_frame(st.session_state[n]))
+    tables = {n: _frame_bytes(st.session_state[n]) for n in SNAPSHOT_KEYS if n in st.session_state}
+    evicted = True
+  dropped: List[str] = []
+  for n in ("lot_df", "preview_df_full"):
+    if sum(tables.values()) <= budget:
+      break
+    if tables.get(n):
+      _snap_put(n, pd.DataFrame())
+      tables[n] = 0
+      dropped.append(n)
+      if n == "lot_df":
+        # 자동 재조회로 다시 한도를 넘는 반복을 막기 위해 사용자가 조회할 때까지 비워 둠
+        st.session_state["lot_fetch_state"] = None
+        st.session_state["lot_cache_info"] = None
+        st.session_state["lot_evicted"] = True
+  usage = {"tables": tables, "total": sum(tables.values()), "budget": budget, "evicted": evicted,
+           "dropped": dropped, "over": sum(tables.values()) > budget}
+  st.session_state["mem_usage"] = usage
+  return usage
+
+def _render_mem_status() -> None:
+  u = st.session_state.get("mem_usage") or _enforce_mem_budget()
+  mb = lambda b: b / (1024 * 1024)
+  detail = " · ".join(f"{n} {mb(b):.1f}MB" for n, b in u["tables"].items())
+  st.caption(f"세션 메모리: {mb(u['total']):.1f} / {mb(u['budget']):.0f}MB ({detail})"
+             + (" · 한도 초과로 파생 데이터 정리" if u["evicted"] else "")
+             + (f" · 비운 표: {', '.join(u.get('dropped') or [])}" if u.get("dropped") else "")
+             + (" · ⚠️ 카트만으로 한도 초과" if u.get("over") else ""))
+  st.number_input("세션 메모리 한도(MB)", min_value=16, max_value=4096, step=16, key="mem_budget_mb")
+
+# ---- 표 행 공급: 정렬·페이지는 Python에서, 브라우저에는 표시 컬럼의 현재 페이지만 ----
+GRID_PAGE_SIZES = [50, 100, 200, 500]
+GRID_SELECTION_DEBOUNCE_MS = 800   # 체크박스 연속 선택을 모아 한 번만 Python으로 전달
+
+def _grid_sort_order(df: pd.DataFrame, col: str, desc: bool) -> np.ndarray:
+  """정렬 결과 행 위치. 스냅샷·(컬럼, 방향)별로 한 번만 계산"""
+  orders = _frame_memo("grid_orders", df, lambda d: {})
+  if (col, desc) not in orders:
+    s = df[col].reset_index(drop=True)
+    orders[(col, desc)] = s.sort_values(ascending=not desc, kind="stable", na_position="last").index.to_numpy()
+  return orders[(col, desc)]
+
+def _grid_options(name: str, df: pd.DataFrame, labels: Dict[str, str],
+                  configure: Callable[[GridOptionsBuilder], None]) -> Dict[str, Any]:
+  """gridOptions를 (표 이름, 컬럼·dtype, 헤더명)별로 한 번만 빌드해 세션에 보관"""
+  cache = st.session_state.setdefault("grid_options", {})
+  key = (name, tuple((str(c), str(t)) for c, t in df.dtypes.items()), tuple(labels.items()))
+  opts = cache.get(key)
+  if opts is None:
+    gb = GridOptionsBuilder.from_dataframe(df)
+    configure(gb)
+    for field, header in labels.items():
+      if field in df.columns:
+        gb.configure_column(field, header_name=header)
+    opts = cache[key] = gb.build()
+  return copy.deepcopy(opts)   # AgGrid/호출 측이 columnDefs 등 중첩 구조를 바꿔도 캐시는 유지
+
+def _grid_window(df: pd.DataFrame, cols: List[str], slot: str, labels: Dict[str, str],
+                 default_size: int = 200) -> pd.DataFrame:
+  """정렬/페이지 선택 UI를 그리고 df에서 cols만, 현재 페이지 행만 잘라 반환"""
+  present = [c for c in cols if c in df.columns]
+  n = len(df.index) if present else 0
+  c_sort, c_desc, c_size, c_page = st.columns([2, 1, 1, 1])
+  with c_sort:
+    sort_col = st.selectbox("정렬", ["(기본)"] + present, key=f"{slot}_sort",
+                            format_func=lambda c: labels.get(c, c))
+  with c_desc:
+    desc = st.checkbox("내림차순", key=f"{slot}_desc")
+  with c_size:
+    size = int(st.selectbox("행/페이지", GRID_PAGE_SIZES, index=GRID_PAGE_SIZES.index(default_size),
+                            key=f"{slot}_size"))
+  pages = max(1, -(-n // size))
+  if int(st.session_state.get(f"{slot}_page", 1)) > pages:   # 결과가 줄었으면 마지막 페이지로
+    st.session_state[f"{slot}_page"] = pages
+  with c_page:
+    page = int(st.number_input(f"페이지(/{pages})", min_value=1, max_value=pages, step=1, key=f"{slot}_page"))
+  if not present:
+    return pd.DataFrame(columns=cols)
+  start = (page - 1) * size
+  st.session_state[f"{slot}_window"] = f"{start}_{size}_{sort_col}_{int(desc)}"   # 페이지별 그리드 키
+  st.caption(f"{min(start + 1, n)}–{min(start + size, n)} / {n}건")
+  # 같은 스냅샷·같은 페이지면 이전에 잘라 둔 객체를 그대로 재사용
+  memo = _frame_memo("grid_orders", df, lambda d: {})
+  pkey = ("page", tuple(present), sort_col, desc, start, size)
+  if pkey not in memo:
+    rows = (_grid_sort_order(df, sort_col, desc)[start:start + size]
+            if sort_col != "(기본)" else slice(start, start + size))
+    memo[pkey] = df[present].iloc[rows]
+  return memo[pkey]
+
+def _page_selection(slot: str, page_df: pd.DataFrame, grid: Any) -> List[LotKey]:
+  """페이지를 넘겨도 선택이 누적되도록 (lotCode, itemCode) 선택 키를 세션에 보관.
+  그리드가 값을 돌려준 경우에만 현재 페이지 행들의 선택 상태를 그 값으로 교체(다른 페이지 선택은 유지)"""
+  sel: Dict[LotKey, None] = st.session_state.setdefault(f"{slot}_sel", {})
+  resp = getattr(grid, "grid_response", None) or {}
+  if "selectedItems" in resp and {"lotCode", "itemCode"} <= set(page_df.columns):
+    for k in _sel_keys(page_df):
+      sel.pop(k, None)
+    picked = pd.DataFrame(resp.get("selectedItems") or [])
+    if not picked.empty and {"lotCode", "itemCode"} <= set(picked.columns):
+      sel.update(dict.fromkeys(_sel_keys(picked)))
+  return list(sel)
+
+def _with_preselection(opts: Dict[str, Any], slot: str, page_df: pd.DataFrame) -> Dict[str, Any]:
+  """다른 페이지에 갔다 와도 이 페이지에서 고른 행이 체크된 채로 보이도록(getRowId = lotCode|itemCode)"""
+  sel = st.session_state.get(f"{slot}_sel") or {}
+  if sel and {"lotCode", "itemCode"} <= set(page_df.columns):
+    opts["preSelectedRows"] = [f"{k[0]}|{k[1]}" for k in _sel_keys(page_df) if k in sel]
+  return opts
+
 # =========================
 # 본문
 # =========================
@@ -636,75 +2173,107 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
     with c4:
       q_lot = st.text_input("LOT NO", value="", key="q_lot")
 
-    c5 = st.columns(1)[0]
+    c5, c6, c7, c8 = st.columns([2, 2, 1, 1])
     with c5:
       if "q_limit" not in st.session_state:
         st.session_state["q_limit"] = 500
       limit = st.number_input("limit", min_value=1, max_value=5000, step=50, key="q_limit")
+    with c6:
+      if "q_page_size" not in st.session_state:
+        st.session_state["q_page_size"] = 200
+      page_size = st.number_input("페이지 크기", min_value=20, max_value=5000, step=50, key="q_page_size")
+    with c7:
+      if "q_paged" not in st.session_state:
+        st.session_state["q_paged"] = True
+      q_paged = st.checkbox("페이지 단위 조회", key="q_paged")
+    with c8:
+      if "q_use_replica" not in st.session_state:
+        st.session_state["q_use_replica"] = False
+      q_use_replica = st.checkbox("로컬 복제본 조회", key="q_use_replica")
 
     submitted = st.form_submit_button("조회")
 
   # 폼 바깥: 검색조건 초기화
-  col_reset = st.columns([1, 3])[0]
+  col_reset, col_cache = st.columns([1, 3])
   with col_reset:
     reset_filters = st.button("검색조건 초기화", key="btn_reset_filters")
+  _enforce_mem_budget()
+
+  @st.fragment
+  def _cache_panel() -> None:
+    with st.expander("⚙️ 캐시 현황", expanded=False):
+      _render_cache_stats()
+      _render_replica_status()
+      _render_mem_status()
+  with col_cache:
+    _cache_panel()
   if reset_filters:
     st.session_state["do_reset_filters"] = True
     st.rerun()
 
   # ── 서버 조회 ──
-  need_fetch = submitted or st.session_state["lot_df"].empty
+  # 페이지 이어받기 중에는 lot_df가 비어 있어도 1페이지부터 다시 받지 않음
+  if submitted:
+    st.session_state["lot_evicted"] = False
+  need_fetch = submitted or (st.session_state["lot_df"].empty and not st.session_state.get("lot_fetch_state")
+                             and not st.session_state.get("lot_evicted"))
   if need_fetch:
+    conds = {
+      "warehouseName": q_wh,
+      "itemCode": q_item_code,
+      "itemName": q_item_name,
+      "lotCode": q_lot,
+    }
+    has_or = any(len(_split_or_terms(v)) > 1 for v in conds.values())
+    company_id_, plant_id_, *_ = _context_ids()
+    replica = _replica_if_enabled()
+    replica_info, replica_df = None, None
+    if replica is not None:
+      # 복제본 오류(파일/DB)는 서버 조회로 대체
+      try:
+        replica_info = replica.status(company_id_, plant_id_)
+        if not replica_info or time.time() - float(replica_info["synced_at"] or 0) > REPLICA_MAX_AGE_SEC:
+          _start_replica_sync(replica)   # 없거나 오래된 복제본은 백그라운드로 (재)동기화
+        if replica_info and not replica_info["ready"]:
+          replica_info = None   # 동기화가 아직 성공한 적 없음(오류만 기록) → 서버 조회
+        if replica_info:
+          replica_df = replica.query(company_id_, plant_id_, conds, int(limit))
+      except (OSError, sqlite3.Error) as e:
+        st.warning(f"로컬 복제본 조회 실패 — 서버에서 조회합니다: {e}")
+        replica_info, replica_df = None, None
+    st.session_state["lot_replica_info"] = None
+    st.session_state["lot_fetch_capped"] = False
+    st.session_state["grid_left_sel"] = {}   # 새 조회 결과에는 이전 선택을 넘기지 않음
     try:
-      sess: requests.Session = st.session_state["sess"]
-      base_url = st.session_state["base_url"].rstrip("/")
-      url = base_url + "/inv/stock-onhand-lot/detail-list"
-      payload = {
-        "languageCode": "KO",
-        "companyId": (st.session_state["org_info"].get("orgCompanyId")
-                      or st.session_state["user_info"].get("companyId") or 0),
-        "plantId": (st.session_state["org_info"].get("plantId")
-                    or st.session_state["user_info"].get("plantId") or 0),
-        "itemCode": _with_leading_percent(q_item_code),
-        "itemName": _with_leading_percent(q_item_name),
-        "itemType": "",
-        "projectCode": "",
-        "projectName": "",
-        "productGroup": "",
-        "itemClass1": "",
-        "itemClass2": "",
-        "warehouseCode": "",
-        "warehouseName": _with_leading_percent(q_wh),
-        "warehouseLocationCode": "",
-        "defectiveFlag": "Y",
-        "itemClass3": "",
-        "itemClass4": "",
-        "effectiveDateFrom": "",
-        "effectiveDateTo": "",
-        "creationDateFrom": "",
-        "creationDateTo": "",
-        "lotStatus": "",
-        "lotCode": _with_leading_percent(q_lot),
-        "jobName": "",
-        "partnerItem": "",
-        "peopleName": "",
-        "start": 1,
-        "page": 1,
-        "limit": str(int(limit)),
-      }
-      with st.spinner("재고(LOT별) 조회 중..."):
-        data = _http_post_json(sess, url, payload, timeout=90)
-      rows = (((data or {}).get("data") or {}).get("list")) or []
-      df_full = pd.DataFrame(rows)
-      df_full = _apply_client_filters(df_full, {
-        "warehouseName": q_wh,
-        "itemCode": q_item_code,
-        "itemName": q_item_name,
-        "lotCode": q_lot,
-      })
-      st.session_state["lot_df"] = df_full
+      cached = None if replica_df is not None else _onhand_cache_lookup(conds, int(limit))
+      if replica_df is not None:
+        # 로컬 복제본에서 즉시 조회
+        _snap_put("lot_df", replica_df)
+        st.session_state["lot_fetch_state"] = None
+        st.session_state["lot_cache_info"] = None
+        st.session_state["lot_replica_info"] = replica_info
+      elif cached is not None:
+        # 같은 조건의 최근 결과: 즉시 표시(오래됐으면 백그라운드에서 갱신)
+        _snap_put("lot_df", cached)
+        st.session_state["lot_fetch_state"] = None
+      elif (q_paged or _has_chosung_cond(conds)) and not has_or:
+        # 페이지 단위: 1페이지를 바로 표시하고 나머지는 화면을 그린 뒤 이어받음
+        # (초성 검색은 서버에서 거를 수 없어 결과가 찰 때까지 페이지를 이어 받아야 하므로 항상 이 경로)
+        with st.spinner("재고(LOT별) 조회 중... (1페이지)"):
+          _start_paged_lot_fetch(conds, int(page_size), int(limit))
+      else:
+        # OR 검색어면 항목별 서버 하위 조회를 병렬로 실행해 합침
+        gen = _onhand_result_cache().generation
+        with st.spinner("재고(LOT별) 조회 중..." + (" (OR 조건 분할 조회)" if has_or else "")):
+          df_full, capped = _fetch_lot_result(conds, int(limit))
+        _snap_put("lot_df", df_full)
+        st.session_state["lot_fetch_capped"] = capped
+        st.session_state["lot_fetch_state"] = None
+        _onhand_cache_store(_onhand_cache_key(conds, int(limit)), df_full, gen)
     except requests.RequestException as e:
       st.error(f"네트워크 오류: {e}")
+  else:
+    _adopt_refreshed_onhand()
 
   # ── 좌/우 레이아웃 ──
   left, right = st.columns(2)
@@ -731,147 +2300,6 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
     }
   """)
 
-  # ---------- 왼쪽: 재고조회(LOT별) ----------
-  with left:
-    c_title, c_btn = st.columns([4, 1])
-    with c_title:
-      st.markdown("### 📦 재고조회(LOT별)")
-    with c_btn:
-      btn_add = st.button("담기", use_container_width=True, key="btn_add")
-
-    df_left_src = st.session_state["lot_df"].copy()
-    display_cols_left = [c for c in preferred if c in df_left_src.columns] + \
-                        [c for c in df_left_src.columns if c not in preferred]
-    df_left_display = df_left_src[display_cols_left] if not df_left_src.empty else pd.DataFrame(columns=preferred)
-
-    gb = GridOptionsBuilder.from_dataframe(df_left_display)
-    gb.configure_selection("multiple", use_checkbox=True)
-    gb.configure_pagination(paginationAutoPageSize=False, paginationPageSize=50)
-    gb.configure_grid_options(
-      rowSelection="multiple",
-      rowMultiSelectWithClick=True,
-      suppressRowClickSelection=False,
-      suppressRowDeselection=False,
-      suppressHorizontalScroll=True,
-      rememberSelected=True,
-      getRowId=js_rowid,
-    )
-    for field, header in header_map.items():
-      if field in df_left_display.columns:
-        gb.configure_column(field, header_name=header)
-    _apply_flex_to_all_columns(gb, list(df_left_display.columns))
-
-    grid_left = AgGrid(
-      df_left_display,
-      gridOptions=gb.build(),
-      height=600,
-      theme="dark",
-      update_mode=GridUpdateMode.SELECTION_CHANGED,
-      data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
-      allow_unsafe_jscode=True,
-      fit_columns_on_grid_load=False,
-      key="grid_left_main",
-    )
-    selected_left = grid_left.get("selected_rows", [])
-    if _sel_len(selected_left) > 0:
-      st.session_state["left_selection"] = (
-        selected_left.to_dict("records") if isinstance(selected_left, pd.DataFrame) else selected_left
-      )
-
-  # ---------- 오른쪽: 카트 ----------
-  with right:
-    c_title2, c_btn2, c_btn3 = st.columns([4, 1, 1])
-    with c_title2:
-      st.markdown("### 🛒 카트")
-    with c_btn2:
-      btn_del = st.button("삭제", use_container_width=True)
-    with c_btn3:
-      btn_convert = st.button("3공장 품목변환", use_container_width=True)
-
-    cart_df_full = st.session_state["cart_df"].copy()
-    display_cols_right = [c for c in preferred if c in cart_df_full.columns] + \
-                         [c for c in cart_df_full.columns if c not in preferred]
-    cart_display = cart_df_full[display_cols_right] if not cart_df_full.empty else pd.DataFrame(columns=preferred)
-
-    gb2 = GridOptionsBuilder.from_dataframe(cart_display)
-    gb2.configure_selection("multiple", use_checkbox=True)
-    gb2.configure_pagination(paginationAutoPageSize=False, paginationPageSize=200)
-    gb2.configure_grid_options(
-      rowSelection="multiple",
-      rowMultiSelectWithClick=True,
-      suppressRowClickSelection=False,
-      suppressRowDeselection=False,
-      suppressHorizontalScroll=True,
-      getRowId=js_rowid,
-    )
-    for field, header in header_map.items():
-      if field in cart_display.columns:
-        gb2.configure_column(field, header_name=header)
-    _apply_flex_to_all_columns(gb2, list(cart_display.columns))
-
-    st.session_state.setdefault("grid_right_nonce", 0)
-    grid_right = AgGrid(
-      cart_display,
-      gridOptions=gb2.build(),
-      height=600,
-      theme="dark",
-      update_mode=GridUpdateMode.SELECTION_CHANGED,
-      data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
-      allow_unsafe_jscode=True,
-      fit_columns_on_grid_load=False,
-      key=f"grid_right_cart_{st.session_state['grid_right_nonce']}",
-    )
-    selected_cart = grid_right.get("selected_rows", [])
-    if _sel_len(selected_cart) > 0:
-      st.session_state["right_selection"] = (
-        selected_cart.to_dict("records") if isinstance(selected_cart, pd.DataFrame) else selected_cart
-      )
-
-  # ---------- 버튼 동작 ----------
-  if btn_add:
-    if _sel_len(selected_left) > 0:
-      sel_df_view = (selected_left.copy() if isinstance(selected_left, pd.DataFrame) else pd.DataFrame(selected_left))
-    else:
-      backup_rows = st.session_state.get("left_selection", [])
-      sel_df_view = (backup_rows.copy() if isinstance(backup_rows, pd.DataFrame) else pd.DataFrame(backup_rows))
-
-    if sel_df_view.empty or not {"lotCode", "itemCode"} <= set(sel_df_view.columns):
-      st.warning("선택된 행이 없습니다.", icon="⚠️")
-    else:
-      keys: Set[Tuple[str, str]] = set(
-        zip(sel_df_view["lotCode"].astype(str), sel_df_view["itemCode"].astype(str))
-      )
-      full_df = st.session_state["lot_df"].copy()
-      full_df["_key"] = list(zip(full_df["lotCode"].astype(str), full_df["itemCode"].astype(str)))
-      add_full = full_df[full_df["_key"].isin(keys)].drop(columns=["_key"])
-      merged = (pd.concat([st.session_state["cart_df"], add_full], ignore_index=True)
-                if not st.session_state["cart_df"].empty else add_full)
-      if {"lotCode", "itemCode"} <= set(merged.columns):
-        merged = merged.drop_duplicates(subset=["lotCode", "itemCode"], keep="first")
-
-      st.session_state["cart_df"] = merged
-      st.session_state["grid_right_nonce"] += 1
-      st.toast(f"{len(add_full)}건 담았습니다.", icon="🧺")
-      st.rerun()
-
-  if 'btn_del' in locals() and btn_del:
-    cur_sel = grid_right.get("selected_rows", [])
-    if _sel_len(cur_sel) == 0:
-      cur_sel = st.session_state.get("right_selection", [])
-    if _sel_len(cur_sel) == 0:
-      st.warning("선택된 행이 없습니다.", icon="⚠️")
-    else:
-      sel_df = (cur_sel.copy() if isinstance(cur_sel, pd.DataFrame) else pd.DataFrame(cur_sel))
-      remain = st.session_state["cart_df"].copy()
-      if not sel_df.empty and "lotCode" in remain.columns and "itemCode" in remain.columns:
-        keys_del = set(zip(sel_df["lotCode"].astype(str), sel_df["itemCode"].astype(str)))
-        mask = ~remain.apply(lambda r: (str(r.get("lotCode")), str(r.get("itemCode"))) in keys_del, axis=1)
-        remain = remain[mask]
-      st.session_state["cart_df"] = remain
-      st.session_state["grid_right_nonce"] += 1
-      st.toast(f"{len(sel_df)}건 삭제했습니다.", icon="🗑️")
-      st.rerun()
-
   # ---------- 품목변환: 보조 조회 함수 ----------
   def _fetch_warehouse_list() -> pd.DataFrame:
     try:
@@ -897,37 +2325,6 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
       st.error(f"창고 목록 조회 실패: {e}")
       return pd.DataFrame()
 
-  def _fetch_item_code_by_name(after_item_name: str) -> str:
-    if not after_item_name:
-      return ""
-    try:
-      sess: requests.Session = st.session_state["sess"]
-      base_url = st.session_state["base_url"].rstrip("/")
-      url = base_url + "/base/item/list"
-      payload = {
-        "languageCode":"KO",
-        "companyId": (st.session_state["org_info"].get("orgCompanyId")
-                      or st.session_state["user_info"].get("companyId") or 0),
-        "status":"Active",
-        "itemPlant": (st.session_state["org_info"].get("plantId")
-                      or st.session_state["user_info"].get("plantId") or 0),
-        "itemCode":"",
-        "itemName": after_item_name,
-        "itemType":"",
-        "productGroup":"",
-        "buyMake":"",
-        "controlLot":"",
-        "start":1,"page":1,"limit":25
-      }
-      data = _http_post_json(sess, url, payload, timeout=60)
-      lst = (((data or {}).get("data") or {}).get("list")) or []
-      if not lst:
-        return ""
-      return str(lst[0].get("itemCode") or "")
-    except requests.RequestException as e:
-      st.error(f"품목정보 조회 실패: {e}")
-      return ""
-
   def _fetch_account_alias_list() -> pd.DataFrame:
     try:
       sess: requests.Session = st.session_state["sess"]
@@ -951,18 +2348,163 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
       st.error(f"기타(입/출) 코드 조회 실패: {e}")
       return pd.DataFrame()
 
-  if 'btn_convert' in locals() and btn_convert:
-    if st.session_state["wh_list"].empty:
-      st.session_state["wh_list"] = _fetch_warehouse_list()
-    if st.session_state["alias_list"].empty:
-      st.session_state["alias_list"] = _fetch_account_alias_list()
-    st.session_state["show_preview"] = True
-    st.session_state["rebuild_preview"] = True  # ← 카트 기준으로 미리보기 재생성 플래그
-    st.session_state["show_lot_change"] = False  # LOT 편집 패널 초기화
-    st.session_state["lot_edit_inputs"] = {}     # LOT 편집 입력 초기화
+  # ---------- 왼쪽: 재고조회(LOT별) ----------
+  # 패널마다 fragment: 패널 안의 위젯 조작은 해당 패널만 다시 그림(담기/삭제/변환은 전체 재실행)
+  @st.fragment
+  def _lot_panel() -> None:
+    c_title, c_btn = st.columns([4, 1])
+    with c_title:
+      st.markdown("### 📦 재고조회(LOT별)")
+      _fs = st.session_state.get("lot_fetch_state")
+      _ci = st.session_state.get("lot_cache_info")
+      _ri = st.session_state.get("lot_replica_info")
+      if _ri:
+        st.caption(f"로컬 복제본 결과 · {int((time.time() - float(_ri['synced_at'] or 0)) // 60)}분 전 동기화 기준"
+                   + ("" if _ri.get("complete") else f" · ⚠️ 부분 복제본(상한 {REPLICA_MAX_ROWS}건) — 누락 가능, 서버 조회 권장"))
+      elif _fs:
+        st.caption(f"⏳ 이어서 조회 중... {_fs['next_page']}페이지 · 누적 {len(st.session_state['lot_df'])}건")
+      elif _ci:
+        _age = int(time.time() - _ci["ts"])
+        _src = "캐시" if _ci.get("hit") else "서버"
+        _bg = " · 백그라운드 갱신 중" if _onhand_result_cache().is_refreshing(_ci["key"]) else ""
+        st.caption(f"{_src} 결과 · {_age}초 전 조회{_bg}")
+      if st.session_state.get("lot_evicted"):
+        st.caption("⚠️ 세션 메모리 한도로 재고 조회 결과를 비웠습니다. 조건을 좁혀 다시 조회하세요.")
+      if st.session_state.get("lot_fetch_capped"):
+        st.caption(f"⚠️ 원본 {LOT_FETCH_MAX_ROWS}건까지만 받아 로컬 필터(초성 등)한 일부 결과입니다. 조건을 좁혀 주세요.")
+    with c_btn:
+      btn_add = st.button("담기", use_container_width=True, key="btn_add")
+
+    # 표시 컬럼만 현재 페이지분 전송(전체 행은 담기 시 lot_df에서 키로 조회)
+    df_left_display = _grid_window(_snap("lot_df"), preferred, "grid_left", header_map)
+
+    def _left_opts(gb: GridOptionsBuilder) -> None:
+      gb.configure_selection("multiple", use_checkbox=True)
+      gb.configure_grid_options(
+        rowSelection="multiple",
+        rowMultiSelectWithClick=True,
+        suppressRowClickSelection=False,
+        suppressRowDeselection=False,
+        suppressHorizontalScroll=True,
+        rememberSelected=True,
+        getRowId=js_rowid,
+      )
+      _apply_flex_to_all_columns(gb, list(df_left_display.columns))
+
+    grid_left = AgGrid(
+      df_left_display,
+      gridOptions=_with_preselection(_grid_options("left", df_left_display, header_map, _left_opts),
+                                     "grid_left", df_left_display),
+      height=600,
+      theme="dark",
+      update_mode=GridUpdateMode.NO_UPDATE,
+      update_on=[("selectionChanged", GRID_SELECTION_DEBOUNCE_MS)],   # 연속 클릭은 한 번에 전달
+      data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
+      allow_unsafe_jscode=True,
+      fit_columns_on_grid_load=False,
+      key=f"grid_left_main_{st.session_state.get('grid_left_window', '')}",   # 페이지마다 새 그리드(이전 페이지 선택값 혼입 방지)
+    )
+    # 페이지별 선택을 누적(담기는 모든 페이지에서 고른 행 대상)
+    left_keys = _page_selection("grid_left", df_left_display, grid_left)
+    if left_keys:
+      st.caption(f"선택 {len(left_keys)}건(전체 페이지)")
+
+    if btn_add:
+      if not left_keys:
+        st.warning("선택된 행이 없습니다.", icon="⚠️")
+      else:
+        cart = st.session_state["cart_df"]
+        keys = list(left_keys)
+        in_cart = _lot_lookup(cart, keys)
+        keys = [k for k, h in zip(keys, in_cart) if h < 0]   # 이미 담긴 키 제외
+        lot_df_ = st.session_state["lot_df"]
+        pos = _lot_lookup(lot_df_, keys)
+        add_full = lot_df_.iloc[pos[pos >= 0]]
+        merged = (pd.concat([cart, add_full], ignore_index=True)
+                  if not cart.empty else add_full.reset_index(drop=True))
+
+        _snap_put("cart_df", merged)
+        st.session_state["grid_right_nonce"] += 1
+        st.toast(f"{len(add_full)}건 담았습니다.", icon="🧺")
+        st.rerun()
+
+  with left:
+    _lot_panel()
+
+  # ---------- 오른쪽: 카트 ----------
+  @st.fragment
+  def _cart_panel() -> None:
+    c_title2, c_btn2, c_btn3 = st.columns([4, 1, 1])
+    with c_title2:
+      st.markdown("### 🛒 카트")
+    with c_btn2:
+      btn_del = st.button("삭제", use_container_width=True)
+    with c_btn3:
+      btn_convert = st.button("3공장 품목변환", use_container_width=True)
+
+    cart_display = _grid_window(_snap("cart_df"), preferred, "grid_right", header_map)
+
+    def _cart_opts(gb2: GridOptionsBuilder) -> None:
+      gb2.configure_selection("multiple", use_checkbox=True)
+      gb2.configure_grid_options(
+        rowSelection="multiple",
+        rowMultiSelectWithClick=True,
+        suppressRowClickSelection=False,
+        suppressRowDeselection=False,
+        suppressHorizontalScroll=True,
+        getRowId=js_rowid,
+      )
+      _apply_flex_to_all_columns(gb2, list(cart_display.columns))
+
+    st.session_state.setdefault("grid_right_nonce", 0)
+    grid_right = AgGrid(
+      cart_display,
+      gridOptions=_with_preselection(_grid_options("cart", cart_display, header_map, _cart_opts),
+                                     "grid_right", cart_display),
+      height=600,
+      theme="dark",
+      update_mode=GridUpdateMode.NO_UPDATE,
+      update_on=[("selectionChanged", GRID_SELECTION_DEBOUNCE_MS)],
+      data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
+      allow_unsafe_jscode=True,
+      fit_columns_on_grid_load=False,
+      key=f"grid_right_cart_{st.session_state['grid_right_nonce']}_{st.session_state.get('grid_right_window', '')}",
+    )
+    right_keys = _page_selection("grid_right", cart_display, grid_right)
+    if right_keys:
+      st.caption(f"선택 {len(right_keys)}건(전체 페이지)")
+
+    if btn_del:
+      if not right_keys:
+        st.warning("선택된 행이 없습니다.", icon="⚠️")
+      else:
+        remain = st.session_state["cart_df"]
+        drop_pos = _lot_positions(remain, right_keys)
+        if len(drop_pos):
+          remain = remain.drop(index=remain.index[drop_pos]).reset_index(drop=True)
+        _snap_put("cart_df", remain)
+        st.session_state["grid_right_sel"] = {}
+        st.session_state["grid_right_nonce"] += 1
+        st.toast(f"{len(right_keys)}건 삭제했습니다.", icon="🗑️")
+        st.rerun()
+
+    if btn_convert:
+      if st.session_state["wh_list"].empty:
+        st.session_state["wh_list"] = _fetch_warehouse_list()
+      if st.session_state["alias_list"].empty:
+        st.session_state["alias_list"] = _fetch_account_alias_list()
+      st.session_state["show_preview"] = True
+      st.session_state["rebuild_preview"] = True  # ← 카트 기준으로 미리보기 재생성 플래그
+      st.session_state["show_lot_change"] = False  # LOT 편집 패널 초기화
+      st.session_state["lot_edit_inputs"] = {}     # LOT 편집 입력 초기화
+      st.rerun()
+
+  with right:
+    _cart_panel()
 
   # ---------- 변환 미리보기 ----------
-  if st.session_state["show_preview"]:
+  @st.fragment
+  def _preview_panel() -> None:
     st.markdown("---")
     st.markdown("#### 🔄 변환 미리보기")
 
@@ -1020,7 +2562,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
     force_rebuild = bool(st.session_state.get("rebuild_preview"))
 
     if force_rebuild:
-      src = st.session_state["cart_df"].copy()
+      src = _snap("cart_df")
       # 카트에 우연히 섞여 있을 수 있는 과거 after/alias 컬럼은 제거 후 깨끗하게 재생성
       drop_cols = [c for c in src.columns if c.startswith("_after_") or c.startswith("_alias_")]
       if drop_cols:
@@ -1028,9 +2570,9 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
     else:
       # 기존 미리보기가 있으면 우선 사용(사용자 LOT 수동변경 유지)
       if not st.session_state["preview_df_full"].empty:
-        src = st.session_state["preview_df_full"].copy()
+        src = _snap("preview_df_full")
       else:
-        src = st.session_state["cart_df"].copy()
+        src = _snap("cart_df")
 
     if src.empty:
       st.info("카트가 비어 있습니다. 왼쪽에서 행을 선택하고 [담기]를 눌러주세요.")
@@ -1040,28 +2582,23 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
         src["_after_itemName"] = "(완)" + src["itemName"].astype(str)
 
         unique_after_names = sorted(src["_after_itemName"].dropna().astype(str).unique())
-        name_to_code: Dict[str, str] = {}
-        for nm in unique_after_names:
-          code = _fetch_item_code_by_name(nm)
-          name_to_code[nm] = code
+        with st.spinner(f"변환 품목코드 조회 중... ({len(unique_after_names)}건)"):
+          name_to_code, name_errors = _resolve_item_codes_by_name(unique_after_names)
+        if name_errors:
+          st.error(f"품목정보 조회 실패 {len(name_errors)}건: {name_errors[0]}")
         src["_after_itemCode"] = src["_after_itemName"].map(name_to_code).fillna("")
 
-        def _rebuild_lot(old_lot: Any, new_code: str) -> str:
-          s = str(old_lot or "")
-          nc = (new_code or "")[:7]
-          if len(s) >= 7 and len(nc) == 7:
-            return nc + s[7:]
-          return s
-
-        src["_after_lotCode"] = [
-          _rebuild_lot(ol, ac) for ol, ac in zip(src["lotCode"].astype(str), src["_after_itemCode"].astype(str))
-        ]
+        # LOT 앞 7자리를 변환 품목코드 앞 7자리로 교체(둘 다 7자 이상일 때만)
+        _lot = src["lotCode"].astype(str)
+        _nc = src["_after_itemCode"].astype(str).str[:7]
+        _ok = (_lot.str.len() >= 7) & (_nc.str.len() == 7)
+        src["_after_lotCode"] = _lot.where(~_ok, _nc + _lot.str[7:])
 
         after_wh_name = str(st.session_state["wh_selected"].get("warehouseName")) if st.session_state["wh_selected"] else ""
         src["_after_warehouseName"] = after_wh_name
         src["_after_primaryUom"] = src["primaryUom"].astype(str)
 
-        _orig_qty = pd.to_numeric(src["onhandQuantity"], errors="coerce")
+        _orig_qty = src["onhandQuantity"]
         src["onhandQuantity"] = _orig_qty.abs() * (-1)
         src["_after_onhandQuantity"] = _orig_qty.abs()
 
@@ -1070,7 +2607,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
             src[f"_alias_{k}"] = v
 
       # ▼ 항상 최신 상태를 세션에 반영(LOT 변경 유지)
-      st.session_state["preview_df_full"] = src.copy()
+      _snap_put("preview_df_full", src)
       st.session_state["rebuild_preview"] = False  # ← 재빌드 플래그 해제
       
       show_cols = [
@@ -1091,23 +2628,19 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
         "_after_primaryUom":"after PrimaryUom",
         "_after_onhandQuantity":"after onhandQuantity",
       }
-      disp = src[[c for c in show_cols if c in src.columns]].copy()
-      gbp = GridOptionsBuilder.from_dataframe(disp)
-      gbp.configure_selection("multiple", use_checkbox=False)
-      gbp.configure_pagination(paginationAutoPageSize=False, paginationPageSize=200)
-      gbp.configure_grid_options(
-        rowSelection="single",
-        suppressHorizontalScroll=True,
-        getRowId=js_rowid,
-      )
-      for field, header in header_map_preview.items():
-        if field in disp.columns:
-          gbp.configure_column(field, header_name=header)
-      for c in disp.columns:
-        gbp.configure_column(c, flex=1, minWidth=90)
+      disp = _grid_window(src, show_cols, "grid_preview", header_map_preview)
+      def _preview_opts(gbp: GridOptionsBuilder) -> None:
+        gbp.configure_selection("multiple", use_checkbox=False)
+        gbp.configure_grid_options(
+          rowSelection="single",
+          suppressHorizontalScroll=True,
+          getRowId=js_rowid,
+        )
+        for c in disp.columns:
+          gbp.configure_column(c, flex=1, minWidth=90)
       AgGrid(
         disp,
-        gridOptions=gbp.build(),
+        gridOptions=_grid_options("preview", disp, header_map_preview, _preview_opts),
         height=380,
         theme="dark",
         update_mode=GridUpdateMode.NO_UPDATE,
@@ -1123,21 +2656,19 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
       # 버튼 클릭 시 편집용 기본값 구성 (_after_itemCode 그룹당 1개)
       if btn_lot_change:
         st.session_state["show_lot_change"] = True
-        df_src = st.session_state["preview_df_full"].copy()
-        inputs = {}
-        def _pick_ymd(lot_str: str) -> str:
-          m = re.search(r"-[A-Za-z0-9]{2}-(\d{6})\d{3}$", str(lot_str or ""))
-          return m.group(1) if m else ""
-        for code, g in df_src.groupby("_after_itemCode", dropna=False):
-          code_s = str(code or "")
-          if not code_s:
-            continue
-          name_s = str(g["_after_itemName"].iloc[0]) if "_after_itemName" in g.columns and not g.empty else ""
-          # 그룹 내 가장 최근(문자 비교 max) YYMMDD 기본값 (컬럼 직접 접근)
-          yy = [ _pick_ymd(x) for x in g["_after_lotCode"].astype(str).tolist() if x ]
-          default_ymd = max(yy) if yy else now_kst().strftime("%y%m%d")  # ← KST
-          inputs[code_s] = {"name": name_s, "ymd": default_ymd}
-        st.session_state["lot_edit_inputs"] = inputs
+        df_src = _snap("preview_df_full")
+        _codes = df_src["_after_itemCode"].astype(str)
+        _lots = df_src["_after_lotCode"].astype(str)
+        # 그룹 내 가장 최근(문자 비교 max) YYMMDD 기본값. 빈 LOT는 제외(NaN), 형식이 다르면 ""
+        _ymd = _lots.str.extract(LOT_YMD_RE, expand=False).fillna("").where(_lots != "")
+        _names = df_src["_after_itemName"].astype(str) if "_after_itemName" in df_src.columns else ""
+        agg = (pd.DataFrame({"code": _codes, "name": _names, "ymd": _ymd})[_codes != ""]
+               .groupby("code").agg(name=("name", "first"), ymd=("ymd", "max")))
+        today_ymd = now_kst().strftime("%y%m%d")  # ← KST
+        st.session_state["lot_edit_inputs"] = {
+          code_s: {"name": name_s, "ymd": ymd if isinstance(ymd, str) else today_ymd}
+          for code_s, name_s, ymd in zip(agg.index, agg["name"], agg["ymd"])
+        }
 
       # 편집 패널 표시
       if st.session_state.get("show_lot_change"):
@@ -1168,33 +2699,30 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
         # 적용 로직: 그룹별로 YYMMDD 반영(체크된 항목만), 뒤 3자리 100부터 순번
         if apply_lot_btn:
-          df_apply = st.session_state["preview_df_full"].copy()
+          df_apply = _snap("preview_df_full")
 
-          def _rebuild_lot(old_lot: str, code7: str, wc2: str, ymd: str, seq: int) -> str:
-            return f"{code7}-{wc2}-{ymd}{seq:03d}"
-
-          total_updates = 0
+          # 체크되고 YYMMDD 형식이 맞는 그룹만: 코드 → YYMMDD
+          ymd_by_code: Dict[str, str] = {}
           for code_s in (st.session_state.get("lot_edit_inputs") or {}):
-            # 체크된 항목만 진행
             if not bool(st.session_state.get(f"chk_{code_s}", False)):   # ★
               continue                                                   # ★
             ymd_in = str(st.session_state.get(f"ymd_{code_s}", "")).strip()
-            if not re.fullmatch(r"\d{6}", ymd_in):
-              continue  # YYMMDD 형식 아닐 때는 건너뜀
-
-            mask = df_apply["_after_itemCode"].astype(str) == code_s
-            idxs = list(df_apply[mask].index)
-
-            for i, idx in enumerate(idxs):
-              old = str(df_apply.at[idx, "_after_lotCode"] or "")
-              m = re.match(r"^([^-]{7})-([^-]{2})-\d{6}\d{3}$", old)
-              code7 = (m.group(1) if m else str(code_s)[:7]).ljust(7)[:7]
-              wc2   = (m.group(2) if m else "C1").ljust(2)[:2]
-              df_apply.at[idx, "_after_lotCode"] = _rebuild_lot(old, code7, wc2, ymd_in, 100 + i)
-              total_updates += 1
+            if re.fullmatch(r"\d{6}", ymd_in):
+              ymd_by_code[code_s] = ymd_in
+
+          codes_all = df_apply["_after_itemCode"].astype(str)
+          sel = codes_all.isin(list(ymd_by_code))
+          total_updates = int(sel.sum())
+          if total_updates:
+            codes = codes_all[sel]
+            parts = _lot_parts(df_apply.loc[sel, "_after_lotCode"])
+            code7 = parts["code7"].fillna(codes.str[:7]).str.ljust(7).str[:7]
+            wc2 = parts["wc2"].fillna("C1").str.ljust(2).str[:2]
+            seq = (codes.groupby(codes).cumcount() + 100).astype(str).str.zfill(3)   # 그룹별 100부터
+            df_apply.loc[sel, "_after_lotCode"] = code7 + "-" + wc2 + "-" + codes.map(ymd_by_code) + seq
 
           # ▼ 표 갱신 강제
-          st.session_state["preview_df_full"] = df_apply
+          _snap_put("preview_df_full", df_apply)
           # (표는 위에서 'src -> disp'로 그려졌기 때문에) 강제 재생성 트리거
           st.session_state["grid_right_nonce"] = st.session_state.get("grid_right_nonce", 0) + 1
           st.toast(f"LOT 변경 적용: {total_updates}건 · YYMMDD 반영 및 100부터 순번 부여", icon="✏️")
@@ -1209,12 +2737,13 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
         _save_payload = {
           "schema_version": 1,
           "saved_at": now_kst().isoformat(),  # ← KST
-          "preview_df_full": st.session_state["preview_df_full"].to_dict(orient="records"),
+          "preview_df_full": _snap_records("preview_df_full"),
           "wh_selected": st.session_state.get("wh_selected"),
           "alias_selected": st.session_state.get("alias_selected"),
           "label_copies": int(st.session_state.get("label_copies", 1)),
-          "org_info": st.session_state.get("org_info", {}),
-          "user_info": st.session_state.get("user_info", {}),
+          # 조직/사용자 정보는 식별용 키만(불러오기에서는 사용하지 않음)
+          "org_info": {k: st.session_state["org_info"].get(k) for k in ("orgCompanyId", "orgCompanyCode", "plantId", "plantCode")},
+          "user_info": {k: st.session_state["user_info"].get(k) for k in ("userId", "userKey")},
         }
         st.download_button(
           "💾 저장(.json)",
@@ -1224,24 +2753,35 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
           use_container_width=True,
           key="btn_preview_save",
         )
+        # 대용량용: 열 단위 압축 스냅샷(불러오기에서 자동 인식). saved_at은 스냅샷 생성 시각
+        _meta = {k: v for k, v in _save_payload.items() if k not in ("preview_df_full", "saved_at")}
+        st.download_button(
+          "🗜️ 저장(압축)",
+          data=_snap_columnar("preview_df_full", _meta),
+          file_name=f"preview_{now_kst().strftime('%Y%m%d_%H%M%S')}.json.gz",  # ← KST
+          mime="application/gzip",
+          use_container_width=True,
+          key="btn_preview_save_columnar",
+        )
 
       with c_sv2:
-        _uploaded = st.file_uploader("📂 불러오기(.json)", type=["json"], key="preview_import_file")
+        _uploaded = st.file_uploader("📂 불러오기(.json / .json.gz)", type=["json", "gz"], key="preview_import_file")
       with c_sv3:
         _apply = st.button("적용", use_container_width=True, key="btn_preview_apply")
 
       # 불러오기 적용
       if _apply and _uploaded is not None:
         try:
-          _payload = json.load(_uploaded)
-          _rows = _payload.get("preview_df_full", [])
-          _df_new = pd.DataFrame(_rows)
-
-          # 숫자 컬럼 1차 정규화
-          _num_cols = ["itemId","warehouseId","accountResultId","onhandQuantity","secondaryQuantity","_after_onhandQuantity"]
-          for _c in _num_cols:
-            if _c in _df_new.columns:
-              _df_new[_c] = pd.to_numeric(_df_new[_c], errors="coerce").fillna(0)
+          # gzip 매직바이트면 열 단위 스냅샷, 아니면 기존 JSON
+          _is_columnar = _uploaded.read(2) == b"\x1f\x8b"
+          _uploaded.seek(0)
+          if _is_columnar:
+            _df_in, _payload = _preview_from_columnar(_uploaded)
+          else:
+            _payload = json.load(_uploaded)
+            _df_in = pd.DataFrame(_payload.get("preview_df_full", []))
+          # 스키마 1차 정규화(ID·수량 숫자화, 코드 문자열화)
+          _df_new = _normalize_lot_frame(_df_in)
 
           # 필수 컬럼 최소 집합
           _need_cols = [
@@ -1257,70 +2797,62 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
           if "secondaryUom" not in _df_new.columns:
             _df_new["secondaryUom"] = _df_new["primaryUom"]
           else:
-            _df_new["secondaryUom"] = _df_new["secondaryUom"].fillna(_df_new["primaryUom"])
+            _df_new["secondaryUom"] = _df_new["secondaryUom"].where(_df_new["secondaryUom"] != "", _df_new["primaryUom"])
 
           if "warehouseCode" not in _df_new.columns:
             _df_new["warehouseCode"] = ""
 
-          # 창고 ID/코드 보정: wh_list 이용
+          # 창고 ID/코드 보정: wh_list와 창고명으로 한 번에 merge (ID가 0이거나 코드가 빈 행만 채움)
           if st.session_state["wh_list"].empty:
             st.session_state["wh_list"] = _fetch_warehouse_list()
-          _wh = st.session_state["wh_list"].copy()
-          _wh_idx = {}
-          if not _wh.empty:
-            for _, r in _wh.iterrows():
-              _wh_idx[str(r.get("warehouseName") or "")] = {
-                "warehouseId": _to_int_safe(r.get("warehouseId"), 0),
-                "warehouseCode": str(r.get("warehouseCode") or "")
-              }
-
-          def _fix_wh(row):
-            nm = str(row.get("warehouseName") or "")
-            info = _wh_idx.get(nm, None)
-            wid = row.get("warehouseId", None)
-            wcd = row.get("warehouseCode", "")
-            if info:
-              if pd.isna(wid) or _to_int_safe(wid, 0) == 0:
-                row["warehouseId"] = info["warehouseId"]
-              if not wcd:
-                row["warehouseCode"] = info["warehouseCode"]
-            row["warehouseId"] = _to_int_safe(row.get("warehouseId"), 0)
-            return row
-
-          _df_new = _df_new.apply(_fix_wh, axis=1)
-
-          # itemId 보정: itemCode 기반 조회
-          def _fix_item(row):
-            iid = _to_int_safe(row.get("itemId"), 0)
-            if iid == 0:
-              icode = str(row.get("itemCode") or "")
-              if icode:
-                pl = _plant_item_list(q_code=icode)
-                if not pl.empty:
-                  iid = _to_int_safe(pl.iloc[0].get("itemId"), 0)
-                  if pd.isna(row.get("primaryUom")) or not str(row.get("primaryUom")):
-                    row["primaryUom"] = str(pl.iloc[0].get("primaryUom") or "")
-                  if pd.isna(row.get("secondaryUom")) or not str(row.get("secondaryUom")):
-                    row["secondaryUom"] = str(pl.iloc[0].get("secondaryUom") or row.get("primaryUom") or "")
-            row["itemId"] = iid
-            return row
-
-          _df_new = _df_new.apply(_fix_item, axis=1)
+          if "warehouseId" not in _df_new.columns:
+            _df_new["warehouseId"] = 0
+          _wh = st.session_state["wh_list"]
+          if not _wh.empty and "warehouseName" in _wh.columns:
+            _wh = _wh.reindex(columns=["warehouseName", "warehouseId", "warehouseCode"])
+            _wh_ref = pd.DataFrame({
+              "warehouseName": _wh["warehouseName"].fillna("").astype(str),
+              "_wh_id": pd.to_numeric(_wh["warehouseId"], errors="coerce").fillna(0).astype(np.int64),
+              "_wh_code": _wh["warehouseCode"].fillna("").astype(str),
+            }).drop_duplicates("warehouseName", keep="last")
+            _m = _df_new[["warehouseName"]].merge(_wh_ref, on="warehouseName", how="left").set_index(_df_new.index)
+            _hit = _m["_wh_id"].notna()
+            _fill_id = _hit & (_df_new["warehouseId"] == 0)
+            _fill_cd = _hit & (_df_new["warehouseCode"] == "")
+            _df_new.loc[_fill_id, "warehouseId"] = _m.loc[_fill_id, "_wh_id"].astype(np.int64)
+            _df_new.loc[_fill_cd, "warehouseCode"] = _m.loc[_fill_cd, "_wh_code"]
+
+          # itemId 보정: itemId가 없는 행의 고유 품목코드만 병렬 조회 후 merge (UOM은 빈 값만 채움)
+          if "itemId" not in _df_new.columns:
+            _df_new["itemId"] = 0
+          if "itemCode" in _df_new.columns:
+            _miss = (_df_new["itemId"] == 0) & (_df_new["itemCode"] != "")
+            if _miss.any():
+              _ref = _plant_item_rows(_df_new.loc[_miss, "itemCode"].tolist()).set_index("itemCode")
+              _codes = _df_new.loc[_miss, "itemCode"]
+              _codes = _codes[_codes.isin(_ref.index)]
+              _df_new.loc[_codes.index, "itemId"] = _codes.map(_ref["itemId"]).astype(np.int64)
+              _empty = _df_new.loc[_codes.index, "primaryUom"] == ""
+              _df_new.loc[_empty[_empty].index, "primaryUom"] = _codes[_empty].map(_ref["primaryUom"])
+              _empty = _df_new.loc[_codes.index, "secondaryUom"] == ""
+              _sec = _codes[_empty].map(_ref["secondaryUom"])
+              _df_new.loc[_empty[_empty].index, "secondaryUom"] = _sec.where(_sec != "", _df_new.loc[_sec.index, "primaryUom"])
 
           # 출고 필수 확장 컬럼 보정
           for col in ["warehouseId","warehouseCode","warehouseName","primaryUom","secondaryUom","itemId","itemCode","lotCode"]:
             if col not in _df_new.columns:
               _df_new[col] = "" if col.endswith("Code") or col.endswith("Name") else 0
 
+          # 행 단위 보정으로 섞인 타입을 스키마로 되돌림
+          _df_new = _normalize_lot_frame(_df_new)
+
           # onhandQuantity가 비어있으면 음수로 채움 (미리보기 규칙)
           if "onhandQuantity" not in _df_new.columns:
-            _df_new["onhandQuantity"] = -pd.to_numeric(_df_new["_after_onhandQuantity"], errors="coerce").fillna(0)
+            _df_new["onhandQuantity"] = -_df_new["_after_onhandQuantity"]
           else:
-            _df_new["onhandQuantity"] = -pd.to_numeric(_df_new["onhandQuantity"], errors="coerce").fillna(
-              pd.to_numeric(_df_new["_after_onhandQuantity"], errors="coerce").fillna(0)
-            ).abs()
+            _df_new["onhandQuantity"] = -_df_new["onhandQuantity"].abs()
 
-          st.session_state["preview_df_full"] = _df_new
+          _snap_put("preview_df_full", _df_new)
           st.session_state["wh_selected"] = _payload.get("wh_selected") or st.session_state.get("wh_selected")
           st.session_state["alias_selected"] = _payload.get("alias_selected") or st.session_state.get("alias_selected")
           st.session_state["label_copies"] = int(_payload.get("label_copies") or st.session_state.get("label_copies", 1))
@@ -1329,7 +2861,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
           _base_cols = ["warehouseName","itemCode","itemName","lotCode","primaryUom","onhandQuantity"]
           _exist = [c for c in _base_cols if c in _df_new.columns]
           if _exist:
-            st.session_state["cart_df"] = _df_new[_exist].copy()
+            _snap_put("cart_df", _df_new[_exist])
 
           st.toast("불러오기 완료", icon="📥")
           st.rerun()
@@ -1346,7 +2878,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
       # ---------- 기타출고 ----------
       if exec_issue_btn:
-        src_full = st.session_state["preview_df_full"].copy()
+        src_full = _snap("preview_df_full")
         if src_full.empty:
           st.warning("미리보기/카트가 비어 있습니다.", icon="⚠️")
           st.stop()
@@ -1365,12 +2897,10 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
           grp_cols = ["itemId","itemCode","warehouseId","warehouseCode","warehouseName","primaryUom","secondaryUom"]
           for col in grp_cols:
             if col not in src_full.columns:
-              src_full[col] = None
+              src_full[col] = 0 if col.endswith("Id") else ""
 
-          grouped = src_full.groupby(grp_cols, dropna=False)
+          grouped = src_full.groupby(grp_cols, dropna=False, observed=True)
 
-          all_results = []
-          created_ids: List[int] = []
           alias = st.session_state["alias_selected"] or {}
           account_alias_id = _to_int_safe(alias.get("accountAliasId"), 10038)
           account_alias_code = str(alias.get("accountAliasCode") or "")          # <-- 코드
@@ -1378,20 +2908,20 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
           company_id, plant_id, company_code, _ = _context_ids()
 
-          for (item_id, item_code, wh_id, wh_code, wh_name, p_uom, s_uom), gdf in grouped:
-            account_num = _get_account_num_by_code_rule(base_date_str)
-            if not account_num:
-              st.error("계정번호 채번 실패(code-rule-assign-data)."); st.stop()
-
-            qty_abs_sum = float(pd.to_numeric(gdf["_after_onhandQuantity"], errors="coerce").fillna(0).sum())
-            sec_abs_sum = float(pd.to_numeric(gdf.get("secondaryQuantity", pd.Series([0]*len(gdf))), errors="coerce").fillna(0).sum())
+          # 그룹 하나의 처리: 채번 → ① top-save → ② top-list/U-저장 → ③ LOT 조회 → ④ lot-save (그룹 내 순서 고정)
+          # 워커 스레드에서 실행되므로 UI 호출 없이 실패는 RuntimeError로 올린다.
+          def _issue_group(group: Tuple[Tuple[Any, ...], pd.DataFrame]) -> Dict[str, Any]:
+            (item_id, item_code, wh_id, wh_code, wh_name, p_uom, s_uom), gdf = group
+            tag = f"[{item_code}/{wh_name}]"
+            qty_abs_sum = float(gdf["_after_onhandQuantity"].sum())
+            sec_abs_sum = float(gdf["secondaryQuantity"].sum()) if "secondaryQuantity" in gdf.columns else 0.0
             lot_count = int(len(gdf.index))
 
             header_rows = [{
-              "editStatus":"I","companyId": company_id,"plantId": plant_id,"accountNum": account_num,
+              "editStatus":"I","companyId": company_id,"plantId": plant_id,"accountNum": "",
               "transactionTypeId": 10079,"transactionTypeCode":"Account_Issue","transactionTypeName":"기타출고",
               "accountAliasId": account_alias_id,"accountAliasCode": account_alias_code,"accountAliasName": account_alias_name,
-              "warehouseId": _to_int_safe(wh_id, 0),"warehouseCode": str(wh_code or ""), "warehouseName": str(wh_name or ""),
+              "warehouseId": int(wh_id),"warehouseCode": wh_code, "warehouseName": wh_name,
               "locationId": 0,"locationCode": None,"locationName": None,
               "transactionDate": tx_dt,
               "accountResultId": 0,"lotCount": lot_count,
@@ -1399,21 +2929,23 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
               "projectId": 0,"effectiveStartDate": None,"effectiveEndDate": None,
               "approvalFlag":"Y","interfaceFlag":"N","workStatus":"I",
               "id":"extModel-streamlit","row-active": True,
-              "itemCode": str(item_code or ""), "itemId": _to_int_safe(item_id, 0),
+              "itemCode": item_code, "itemId": int(item_id),
               "itemName": str(gdf.iloc[0].get("itemName") or ""),
-              "controlLotSerial":"LOT","primaryUom": str(p_uom or ""), "secondaryUom": str(s_uom or (p_uom or "")),
+              "controlLotSerial":"LOT","primaryUom": p_uom, "secondaryUom": s_uom or p_uom,
               "effectivePeriodOfDay": 0,"effectivePeriodOfDayFlag":"N","errorField": {}
             }]
 
-            with st.spinner(f"① 기타출고 헤더 저장(top-save) 중... [{item_code}/{wh_name}]"):
+            # 채번 → ① 기타출고 헤더 저장(top-save): 배치 안에서 한 번에 하나씩
+            with acct_issuer.hold(base_date_str) as account_num:
+              if not account_num:
+                raise RuntimeError(f"계정번호 채번 실패(code-rule-assign-data). {tag}")
+              header_rows[0]["accountNum"] = account_num
               account_result_id = _top_save_account_issue(header_rows)
             if not account_result_id:
-              st.error("top-save 실패"); st.stop()
-            created_ids.append(int(account_result_id))
+              raise RuntimeError(f"top-save 실패 {tag}")
 
             # ② 저장내용 조회(top-list) → 거래일자만 U-저장
-            with st.spinner(f"② 저장내용 조회(top-list) 중... [{item_code}/{wh_name}]"):
-              confirm = _top_list_confirm_issue(account_num, str(item_code or ""), tx_ymd)
+            confirm = _top_list_confirm_issue(account_num, item_code, tx_ymd)
             lst = (((confirm or {}).get("data") or {}).get("list")) or []
             if lst:
               row = dict(lst[0])
@@ -1421,25 +2953,20 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
             # ③ LOT 상세조회/저장 준비 → ④ LOT 저장(lot-save)
             lot_records: List[Dict[str,Any]] = []
-            with st.spinner(f"③ LOT 상세조회/저장 준비 중... [{item_code}/{wh_name}]"):
-              for _, r in gdf.iterrows():
-                it_id = _to_int_safe(r.get("itemId"), 0)
-                lot_code = str(r.get("lotCode") or "")
-                src_wh_id = _to_int_safe(r.get("warehouseId"), 0)
-                rec = _fetch_lot_onhand_record(it_id, lot_code, src_wh_id)
-                if not rec:
-                  st.error(f"LOT 상세조회 실패: {lot_code}"); st.stop()
-                rec = dict(rec); rec["accountResultId"] = int(account_result_id); rec["interfaceFlag"] = "N"
-                lot_records.append(rec)
-
-            with st.spinner(f"④ LOT 저장(lot-save) 중... [{item_code}/{wh_name}]"):
-              ok = _lot_save_issue(lot_records)
-            if not ok:
-              st.error("lot-save 실패"); st.stop()
-
-            # 결과 축적(기존 로직 유지)
+            lot_codes = gdf["lotCode"].tolist()
+            fetched = _resolve_lot_onhand_records(int(item_id), int(wh_id), lot_codes)
+            for lot_code, rec in zip(lot_codes, fetched):
+              if not rec:
+                raise RuntimeError(f"LOT 상세조회 실패: {lot_code}")
+              rec = dict(rec); rec["accountResultId"] = int(account_result_id); rec["interfaceFlag"] = "N"
+              lot_records.append(rec)
+
+            if not _lot_save_issue(lot_records):
+              raise RuntimeError(f"lot-save 실패 {tag}")
+
+            # 결과(기존 로직 유지)
             if lst:
-              all_results.append({
+              return {
                 "accountNum": row.get("accountNum"),
                 "itemCode": row.get("itemCode"),
                 "itemName": row.get("itemName"),
@@ -1448,14 +2975,35 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
                 "primaryQuantity": row.get("primaryQuantity"),
                 "secondaryQuantity": row.get("secondaryQuantity"),
                 "accountResultId": _to_int_safe(row.get("accountResultId"), account_result_id),
-              })
-            else:
-              all_results.append({
-                "accountNum": account_num, "itemCode": str(item_code or ""),
-                "itemName": str(gdf.iloc[0].get("itemName") or ""), "warehouseName": wh_name,
-                "lotCount": lot_count, "primaryQuantity": -qty_abs_sum, "secondaryQuantity": -sec_abs_sum,
-                "accountResultId": int(account_result_id),
-              })
+              }
+            return {
+              "accountNum": account_num, "itemCode": item_code,
+              "itemName": str(gdf.iloc[0].get("itemName") or ""), "warehouseName": wh_name,
+              "lotCount": lot_count, "primaryQuantity": -qty_abs_sum, "secondaryQuantity": -sec_abs_sum,
+              "accountResultId": int(account_result_id),
+            }
+
+          # 그룹끼리는 병렬, transfer는 모든 그룹 완료 후 1회
+          groups = list(grouped)
+          acct_issuer = _AccountNumIssuer()
+          with st.status(f"①~④ 기타출고 그룹 처리 중... (0/{len(groups)})", expanded=True) as issue_status:
+            done_res: List[Dict[str, Any]] = []
+            def _on_group_done(i: int, res: Dict[str, Any]) -> None:
+              done_res.append(res)
+              issue_status.update(label=f"①~④ 기타출고 그룹 처리 중... ({len(done_res)}/{len(groups)})")
+              issue_status.write(f"✔ [{res['itemCode']}/{res['warehouseName']}] 전표 {res['accountNum']} · LOT {res['lotCount']}")
+            try:
+              all_results = _parallel_map(_issue_group, groups, on_done=_on_group_done)
+            except Exception as re_err:
+              issue_status.update(label=f"기타출고 그룹 처리 실패 (완료 {len(done_res)}/{len(groups)})", state="error")
+              st.error(str(re_err))
+              if done_res:
+                # 이미 저장된 전표는 transfer 전이므로 수동 확인/처리 필요
+                st.warning("실패 전에 이미 저장된 전표(transfer 미실행):")
+                for r in done_res:
+                  st.write(f"- 전표 **{r['accountNum']}** · accountResultId={r['accountResultId']} · {r['itemCode']}/{r['warehouseName']} · LOT {r['lotCount']}")
+              st.stop()
+            issue_status.update(label=f"①~④ 기타출고 그룹 처리 완료 ({len(groups)}건)", state="complete", expanded=False)
 
           with st.spinner("⑤ 인터페이스 처리(transfer) 중..."):
             ok_transfer = _transfer_account_issue([r["accountResultId"] for r in all_results])
@@ -1465,13 +3013,22 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
           st.success("✅ 기타출고 + 인터페이스(transfer) 완료")
           for r in all_results:
             st.write(f"- 전표: **{r['accountNum']}** / 창고: **{r['warehouseName']}** / {r['itemCode']} ({r['itemName']}) / LOT:{r['lotCount']} / 기본:{r['primaryQuantity']} · 2차:{r['secondaryQuantity']} / accountResultId:{r['accountResultId']}")
+          # 출고된 LOT가 들어 있거나 검색조건에 걸리는 재고 조회 캐시 무효화
+          _invalidate_onhand_cache(src_full[[c for c in ("lotCode","itemCode","itemName","warehouseName") if c in src_full.columns]])
+          # 출고된 LOT만 재조회해 왼쪽 재고 표에 반영(전체 재조회 없음)
+          try:
+            with st.spinner("재고 변경분 반영 중..."):
+              _n = _refresh_lot_rows(src_full[[c for c in ("lotCode","itemCode","warehouseName") if c in src_full.columns]])
+            st.caption(f"재고 표 반영(다음 화면 갱신 시 표시): 갱신 {_n[0]} · 소진 제거 {_n[1]} · 추가 {_n[2]}")
+          except requests.RequestException as e:
+            st.warning(f"재고 변경분 반영 실패(조회로 갱신하세요): {e}")
 
         except Exception as ex:
           st.error(f"예외 발생: {ex}")
 
       # ---------- 🏷️ 라벨출력 : 클라이언트 PDF-417 + 팝업 인쇄 ----------
       if exec_label_btn:
-        after_df = st.session_state["preview_df_full"].copy()
+        after_df = _snap("preview_df_full")
         if after_df.empty:
           st.warning("미리보기/카트가 비어 있습니다.", icon="⚠️")
           st.stop()
@@ -1480,6 +3037,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
           # after 품목코드별로 품목 API 호출하여 specialbType / color 확보
           unique_codes = sorted(after_df["_after_itemCode"].dropna().astype(str).unique())
+          _prefetch_plant_items(unique_codes)
           code_to_extra: Dict[str, Dict[str, Any]] = {}
           for code in unique_codes:
             info = _plant_item_list(q_code=code)
@@ -1497,7 +3055,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
             aft_code = str(row.get("_after_itemCode") or "")
             aft_name = str(row.get("_after_itemName") or "")
             lot_code = str(row.get("_after_lotCode") or "")
-            qty = str(int(round(float(pd.to_numeric(row.get("_after_onhandQuantity"), errors="coerce") or 0))))
+            qty = str(int(round(row.get("_after_onhandQuantity") or 0)))
             aft_uom = str(row.get("_after_primaryUom") or "")
             extra = code_to_extra.get(aft_code, {"specialbType":"","color":""})
             specialbType = str(extra.get("specialbType") or "")
@@ -1562,7 +3120,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
             labels_local: List[str] = []
             for _, r in df_src.iterrows():
               aft_lot = str(r.get("_after_lotCode") or "")
-              qty_val = str(int(round(float(pd.to_numeric(r.get("_after_onhandQuantity"), errors="coerce") or 0))))
+              qty_val = str(int(round(r.get("_after_onhandQuantity") or 0)))
               barcode_text = re.sub(r"[-]", "", aft_lot) + qty_val
               codes = encode(barcode_text, columns=6, security_level=2)
               img = render_image(codes, scale=4, ratio=5, padding=0)
@@ -1573,7 +3131,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
                 labels_local.append(_label_html(r.to_dict(), data_url))
             return "\n".join(labels_local)
 
-          df_all = after_df.copy()
+          df_all = after_df
           df_lh = df_all[df_all["_after_itemName"].astype(str).str.contains(r"\bLH\b", case=False, na=False)]
           df_rh = df_all[df_all["_after_itemName"].astype(str).str.contains(r"\bRH\b", case=False, na=False)]
           combined_html_all = _build_labels_html(df_all, copies)
@@ -1679,7 +3237,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
       # ---------- 기타입고 (저장 → 전송 즉시) ----------
       if exec_receipt_btn:
-        after_df = st.session_state["preview_df_full"].copy()
+        after_df = _snap("preview_df_full")
         if after_df.empty:
           st.warning("미리보기/카트가 비어 있습니다.", icon="⚠️")
           st.stop()
@@ -1700,26 +3258,28 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
           account_alias_code = str(alias.get("accountAliasCode") or "")   # ← 추가
           account_alias_name = str(alias.get("accountAliasName") or "TEST")
 
-          grp = after_df.groupby(["_after_itemCode","_after_itemName","_after_primaryUom"], dropna=False)
+          grp = after_df.groupby(["_after_itemCode","_after_itemName","_after_primaryUom"], dropna=False, observed=True)
+
+          # 전송(bottom-transmit-proc)은 전표 ID 없이 세션 단위로 처리되므로, 다른 품목의 LOT가 섞이지 않게
+          # ② bottom-save부터 ③ 전송까지를 품목 하나씩 직렬화(헤더 단계 ①만 병렬)
+          transmit_lock = threading.Lock()
 
-          results = []
-          for (aft_code, aft_name, aft_uom), g in grp:
+          # 품목 하나의 처리: 품목조회 → 채번 → ① top-save → top-list/U-저장 → ② bottom-save → ③ 전송
+          # 워커 스레드에서 실행되므로 UI 호출 없이 실패는 RuntimeError로 올린다.
+          def _receipt_group(group: Tuple[Tuple[Any, ...], pd.DataFrame]) -> Dict[str, Any]:
+            (aft_code, aft_name, aft_uom), g = group
             plant_items = _plant_item_list(q_code=str(aft_code or ""))
             if plant_items.empty:
-              st.error(f"품목정보 없음: {aft_code} / {aft_name}"); st.stop()
+              raise RuntimeError(f"품목정보 없음: {aft_code} / {aft_name}")
             item_row = plant_items.iloc[0]
             item_id = _to_int_safe(item_row.get("itemId"), 0)
             primary_uom = str(item_row.get("primaryUom") or aft_uom or "")
             secondary_uom = str(item_row.get("secondaryUom") or primary_uom)
 
-            total_qty = float(pd.to_numeric(g["_after_onhandQuantity"], errors="coerce").fillna(0).sum())
-
-            acct_num = _get_account_num_by_code_rule(base_ymd)
-            if not acct_num:
-              st.error("타계정번호 채번 실패"); st.stop()
+            total_qty = float(g["_after_onhandQuantity"].sum())
 
             header = [{
-              "editStatus":"I","companyId":company_id,"plantId":plant_id,"accountNum":acct_num,
+              "editStatus":"I","companyId":company_id,"plantId":plant_id,"accountNum":"",
               "transactionTypeId":10080,"transactionTypeCode":"Account_Receipt","transactionTypeName":"기타입고",
               "accountAliasId":account_alias_id,"accountAliasCode":account_alias_code,"accountAliasName":account_alias_name,
               "warehouseId":wh_id,"warehouseCode":wh_code,"warehouseName":wh_name,
@@ -1734,15 +3294,19 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
               "controlLotSerial":"LOT","primaryUom":primary_uom,"secondaryUom":secondary_uom,
               "effectivePeriodOfDay":0,"effectivePeriodOfDayFlag":"N","availableForLocationFlag":"N","errorField":{}
             }]
-            with st.spinner(f"① 기타입고 헤더 저장(top-save) 중... [{aft_code}]"):
-              ok = _receipt_top_save(header)
-            if not ok:
-              st.error("기타입고 top-save 실패"); st.stop()
+            # 채번 → ① 기타입고 헤더 저장(top-save): 배치 안에서 한 번에 하나씩
+            with acct_issuer.hold(base_ymd) as acct_num:
+              if not acct_num:
+                raise RuntimeError(f"타계정번호 채번 실패 [{aft_code}]")
+              header[0]["accountNum"] = acct_num
+              saved = _receipt_top_save(header)
+            if not saved:
+              raise RuntimeError(f"기타입고 top-save 실패 [{aft_code}]")
 
             tl = _receipt_top_list(ymd=base_ymd)
-            tl = tl[(tl["accountNum"]==acct_num)]
+            tl = tl[(tl["accountNum"]==acct_num)] if "accountNum" in tl.columns else tl.iloc[0:0]
             if tl.empty:
-              st.error("기타입고 top-list 조회 실패"); st.stop()
+              raise RuntimeError(f"기타입고 top-list 조회 실패 [{aft_code}]")
             top_row = tl.iloc[0].to_dict()
             account_result_id = int(top_row["accountResultId"])
             # ▼ 거래일자만 버튼 시각으로 즉시 U-저장 (Save → Update → Save → Transfer)
@@ -1750,7 +3314,7 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
 
             lot_rows = []
             for _, row in g.iterrows():
-              _qty = float(pd.to_numeric(row["_after_onhandQuantity"], errors="coerce") or 0)
+              _qty = float(row["_after_onhandQuantity"])
               lot_rows.append({
                 "editStatus":"I","companyId":company_id,"plantId":plant_id,"accountResultId":account_result_id,
                 "warehouseId":wh_id,"warehouseCode":wh_code,"warehouseName":wh_name,
@@ -1762,22 +3326,77 @@ if st.session_state["is_authed"] and st.session_state["show_lot_view"]:
                 "lotCode":str(row["_after_lotCode"]),"lotType":"양품","lotId":0,"interfaceFlag":"N",
                 "id":"ext-receipt-lot","row-active":True,"errorField":{}
               })
-            with st.spinner(f"② LOT 저장(bottom-save) 중... [{aft_code}]"):
+            with transmit_lock:
+              # ② LOT 저장(bottom-save)
               ok2, err_msg = _receipt_bottom_save(lot_rows)
-            if not ok2:
-              st.error(f"기타입고 bottom-save 실패: {err_msg or '서버 사유 미반환'}")
-              st.stop()
+              if not ok2:
+                raise RuntimeError(f"기타입고 bottom-save 실패: {err_msg or '서버 사유 미반환'} [{aft_code}]")
 
-            with st.spinner("③ 전송 처리 중...(menugrid → bottom-transmit → top-transmit)"):
+              # ③ 전송 처리(menugrid → bottom-transmit → top-transmit)
               ok_tx = _receipt_transmit(account_result_id, base_ymd)  # ← 방금 쓴 거래일자 날짜(YYYY-MM-DD)로 고정
             if not ok_tx:
-              st.error("전송 실패(top/bottom transmit)"); st.stop()
-
-            results.append({"accountNum":acct_num, "accountResultId":account_result_id, "itemCode":aft_code, "qty":total_qty})
+              raise RuntimeError(f"전송 실패(top/bottom transmit) [{aft_code}]")
+
+            return {"accountNum":acct_num, "accountResultId":account_result_id, "itemCode":aft_code, "qty":total_qty}
+
+          # 품목끼리는 병렬(동시 요청 수 상한), 결과는 품목 그룹 순서대로
+          groups = list(grp)
+          with st.spinner(f"품목정보 조회 중... ({len(groups)}건)"):
+            _prefetch_plant_items([str(k[0] or "") for k, _ in groups])
+          acct_issuer = _AccountNumIssuer()
+          with st.status(f"①~③ 기타입고 품목 처리 중... (0/{len(groups)})", expanded=True) as receipt_status:
+            done_res: List[Dict[str, Any]] = []
+            def _on_receipt_done(i: int, res: Dict[str, Any]) -> None:
+              done_res.append(res)
+              receipt_status.update(label=f"①~③ 기타입고 품목 처리 중... ({len(done_res)}/{len(groups)})")
+              receipt_status.write(f"✔ [{res['itemCode']}] 전표 {res['accountNum']} · 수량 {res['qty']}")
+            try:
+              results = _parallel_map(_receipt_group, groups, on_done=_on_receipt_done)
+            except Exception as re_err:
+              receipt_status.update(label=f"기타입고 품목 처리 실패 (완료 {len(done_res)}/{len(groups)})", state="error")
+              st.error(str(re_err))
+              if done_res:
+                # 실패 시점에 진행 중이던 품목도 끝까지 입고·전송됐으면 포함(_parallel_map이 on_done으로 알림)
+                st.warning("실패와 별개로 입고·전송이 완료된 전표(실제 재고 반영됨):")
+                for r in done_res:
+                  st.write(f"- 전표 **{r['accountNum']}** · accountResultId={r['accountResultId']} · 품목 {r['itemCode']} · 수량 {r['qty']}")
+                # 이미 입고된 품목의 after LOT가 걸리는 재고 조회 캐시는 무효화
+                _after_cols = {"_after_lotCode":"lotCode","_after_itemCode":"itemCode","_after_itemName":"itemName","_after_warehouseName":"warehouseName"}
+                if "_after_itemCode" in after_df.columns:
+                  _done_items = {str(r["itemCode"]) for r in done_res}
+                  _done_after = after_df[after_df["_after_itemCode"].astype(str).isin(_done_items)]
+                  _invalidate_onhand_cache(_done_after[[c for c in _after_cols if c in _done_after.columns]].rename(columns=_after_cols))
+              st.stop()
+            receipt_status.update(label=f"①~③ 기타입고 품목 처리 완료 ({len(groups)}건)", state="complete", expanded=False)
 
           st.success("✅ 기타입고 저장 + 전송 완료")
           for r in results:
             st.write(f"- 전표 **{r['accountNum']}** · accountResultId={r['accountResultId']} · 품목 {r['itemCode']} · 수량 {r['qty']}")
+          # 새로 입고된 after LOT가 검색조건에 걸리는 재고 조회 캐시 무효화
+          _after_cols = {"_after_lotCode":"lotCode","_after_itemCode":"itemCode","_after_itemName":"itemName","_after_warehouseName":"warehouseName"}
+          _touched_after = after_df[[c for c in _after_cols if c in after_df.columns]].rename(columns=_after_cols)
+          _invalidate_onhand_cache(_touched_after)
+          # 새 after LOT만 재조회해 왼쪽 재고 표에 반영(전체 재조회 없음)
+          try:
+            with st.spinner("재고 변경분 반영 중..."):
+              _n = _refresh_lot_rows(_touched_after)
+            st.caption(f"재고 표 반영(다음 화면 갱신 시 표시): 갱신 {_n[0]} · 소진 제거 {_n[1]} · 추가 {_n[2]}")
+          except requests.RequestException as e:
+            st.warning(f"재고 변경분 반영 실패(조회로 갱신하세요): {e}")
 
         except Exception as e:
           st.error(f"예외: {e}")
+
+  if st.session_state["show_preview"]:
+    _preview_panel()
+
+  # ── 페이지 단위 조회 이어받기: 화면을 모두 그린 뒤 다음 페이지를 받아 다시 그림 ──
+  # (기타출고/라벨/기타입고 버튼은 미리보기 fragment만 재실행하므로 실행 결과가 이 단계에서 지워지지 않음)
+  if st.session_state.get("lot_fetch_state"):
+    try:
+      _continue_paged_lot_fetch()
+    except requests.RequestException as e:
+      st.session_state["lot_fetch_state"] = None
+      st.error(f"네트워크 오류(다음 페이지): {e}")
+    else:
+      st.rerun()